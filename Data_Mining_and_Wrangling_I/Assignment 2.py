@@ -14,7 +14,7 @@ def get_continent_urls():
     absolute url to that OAV page as value.
     """
 
-    response = (requests.get(url))
+    response = (session.get(url))
     soup = BeautifulSoup(response.content, "html.parser")
     continent = {}
     for link in soup.find_all('a', limit=4):
@@ -27,12 +27,12 @@ def get_fsp_urls(continent):
     continent as key and the list of urls to the precint JSON files as values.
     """
 
-    response = (requests.get(url))
+    response = (session.get(url))
     soup = BeautifulSoup(response.content, "html.parser")
     for link in soup.find_all('a', limit=4):
         if continent in link.get('href'):
             new_url = urljoin(url, link.get('href'))
-    response = (requests.get(new_url))
+    response = (session.get(new_url))
     soup = BeautifulSoup(response.content, "html.parser")
     fsp_urls = {}
     for link in soup.find_all('a')[4:]:
@@ -48,18 +48,18 @@ def senator_votes(continent, fsp):
     the total votes received in the given continent and fsp as values.
     """
 
-    response = (requests.get(url))
+    response = (session.get(url))
     soup = BeautifulSoup(response.content, "html.parser")
     for link in soup.find_all('a', limit=4):
         if continent in link:
             new_url = urljoin(url, link.get('href'))
-    new_response = (requests.get(new_url))
+    new_response = (session.get(new_url))
     soup = BeautifulSoup(new_response.content, "html.parser")
     sv = {}
     for link in soup.find_all('a'):
         if fsp in link.get_text():
             new_url = urljoin(url, link.get('href'))
-            new_response = (requests.get(new_url).json())
+            new_response = (session.get(new_url).json())
             for i in range(len(new_response['results'])):
                 if sv.get(new_response['results'][i]['bName']) == None:
                     sv[new_response['results'][i]['bName']] = list()
@@ -76,7 +76,7 @@ def latest_stories():
     appearance on the webpage.
     """
 
-    response = requests.get(url)
+    response = session.get(url)
     soup = BeautifulSoup(response.content, 'html.parser')
     stories = pd.DataFrame(columns=['category'])
     for i, data in enumerate(soup.select('div .swiper-slide > #tr_boxs3')):
@@ -92,7 +92,7 @@ def category_posts(topic):
     webpage.
     """
 
-    response = requests.get(url)
+    response = session.get(url)
     soup = BeautifulSoup(response.content)
     info = f"div[data-tb-region='Channel Box - {topic.title()}']"
     more_info = soup.select_one(info)
@@ -132,6 +132,537 @@ def get_books():
             p_list.append(p_raw[1])
     return [(t, p) for t, p in list(zip(t_list, p_list))]
 
+import hashlib
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from requests.structures import CaseInsensitiveDict
+
+class ResponseCache:
+    """SQLite store of HTTP GET responses shared by `CachedSession`
+
+    Responses are keyed by the URL with sorted query parameters, leaving
+    out credentials so that rotating an API key or bearer token does not
+    invalidate the cache. A stale response carrying an ETag or
+    Last-Modified header is revalidated with a conditional request instead
+    of being downloaded again.
+
+    Parameters
+    ----------
+    path : str
+        SQLite database file
+    ttls : dict, optional
+        Seconds a response stays fresh keyed by URL prefix; the longest
+        matching prefix wins and a value of None never expires
+    default_ttl : float, optional
+        Seconds a response of any other URL stays fresh; 0 by default, so
+        that only the endpoints listed in `ttls` are served from the cache
+    max_size : int, optional
+        Bytes of response bodies to keep; the least recently used responses
+        are evicted beyond it
+    secret_params : sequence of str, optional
+        Query parameters left out of the key
+
+    Attributes
+    ----------
+    hits : int
+        Responses served without a request
+    revalidations : int
+        Stale responses confirmed unchanged by a 304
+    misses : int
+        Responses downloaded
+    """
+
+    SECRET_PARAMS = ('key', 'api_key', 'apikey', 'access_token',
+                     'client_secret')
+
+    def __init__(self, path='api_cache.sqlite', ttls=None, default_ttl=0,
+                 max_size=256 * 2**20, secret_params=SECRET_PARAMS):
+        self.path = path
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.secret_params = set(secret_params)
+        self.hits = self.revalidations = self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, '
+            'content BLOB, size INTEGER, stored REAL, accessed REAL)')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed '
+            'ON responses (accessed)')
+        self._conn.commit()
+
+    def normalize_url(self, url):
+        """Return `url` with sorted query parameters and no credentials"""
+        parts = urlsplit(url)
+        query = sorted((name, value) for name, value
+                       in parse_qsl(parts.query, keep_blank_values=True)
+                       if name.lower() not in self.secret_params)
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                           parts.path, urlencode(query), ''))
+
+    def key(self, url):
+        """Return the cache key of `url`"""
+        return hashlib.sha256(self.normalize_url(url).encode()).hexdigest()
+
+    def ttl(self, url):
+        """Return the seconds a response of `url` stays fresh"""
+        url = self.normalize_url(url)
+        prefixes = [prefix for prefix in self.ttls if url.startswith(prefix)]
+        if not prefixes:
+            return self.default_ttl
+        return self.ttls[max(prefixes, key=len)]
+
+    def get(self, url):
+        """Return the cached entry of `url` as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, headers, content, stored FROM responses '
+                'WHERE key = ?', (self.key(url),)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                'UPDATE responses SET accessed = ? WHERE key = ?',
+                (time.time(), self.key(url)))
+            self._conn.commit()
+        status, headers, content, stored = row
+        return {'status': status, 'headers': json.loads(headers),
+                'content': content, 'stored': stored}
+
+    def is_fresh(self, url, entry):
+        """Return whether `entry` of `url` can be served as is"""
+        ttl = self.ttl(url)
+        return ttl is None or time.time() - entry['stored'] < ttl
+
+    def set(self, url, response):
+        """Store `response` of `url` and evict beyond `max_size`
+
+        Responses that are never fresh and cannot be revalidated are not
+        stored.
+        """
+        if (self.ttl(url) == 0 and 'ETag' not in response.headers
+                and 'Last-Modified' not in response.headers):
+            return
+        content = response.content
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, '
+                '?, ?)',
+                (self.key(url), self.normalize_url(url),
+                 response.status_code, json.dumps(dict(response.headers)),
+                 content, len(content), now, now))
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, url):
+        """Drop the entry of `url`, e.g. an error reported with status 200"""
+        with self._lock:
+            self._conn.execute('DELETE FROM responses WHERE key = ?',
+                               (self.key(url),))
+            self._conn.commit()
+
+    def refresh(self, url):
+        """Mark the entry of `url` as fresh after a 304"""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE responses SET stored = ? WHERE key = ?',
+                (time.time(), self.key(url)))
+            self._conn.commit()
+
+    def _evict(self):
+        total, = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()
+        if total <= self.max_size:
+            return
+        stale = []
+        for key, size in self._conn.execute(
+                'SELECT key, size FROM responses ORDER BY accessed'):
+            if total <= self.max_size:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', stale)
+
+    def count(self, outcome):
+        """Increment the counter of `outcome`"""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def cache_info(self):
+        """Return the counters with the number and bytes of entries"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+        return {'hits': self.hits, 'revalidations': self.revalidations,
+                'misses': self.misses, 'entries': entries, 'size': size}
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+            self.hits = self.revalidations = self.misses = 0
+
+import random
+from email.utils import parsedate_to_datetime
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return the seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, self.paused_until - now, 0.0)
+
+    def pause(self, seconds):
+        """Hand out no token for the next `seconds`"""
+        with self._lock:
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + seconds)
+
+class RateLimiter:
+    """Throttle requests per host and per credential
+
+    Each request takes a token from the bucket of its host and from the
+    bucket of its host and credential (the Authorization header or a
+    secret query parameter). Responses with status 429 or 503 pause those
+    buckets and are retried after the `Retry-After` or
+    `x-rate-limit-reset` header, or else after a jittered exponential
+    backoff. POST, PUT and PATCH requests are only retried on 429, since
+    a 503 may come from a gateway after the backend applied them. A
+    response announcing no remaining calls pauses the buckets until its
+    `x-rate-limit-reset`.
+
+    Parameters
+    ----------
+    host_rates : dict, optional
+        Requests per second allowed per host
+    credential_rates : dict, optional
+        Requests per second allowed per credential, keyed by host
+    default_rate : float, optional
+        Requests per second of hosts missing from the dicts; None (the
+        default) leaves them unthrottled, only backing off on 429 and 503
+    max_retries : int, optional
+        Retries of a throttled request before returning its response
+    backoff : float, optional
+        Seconds of the first backoff, doubled at each retry
+    max_backoff : float, optional
+        Upper bound of the backoff
+    secret_params : sequence of str, optional
+        Query parameters identifying the credential
+    """
+
+    RETRY_STATUSES = (429, 503)
+    UNSAFE_METHODS = ('POST', 'PUT', 'PATCH')
+
+    def __init__(self, host_rates=None, credential_rates=None,
+                 default_rate=None, max_retries=5, backoff=1.0,
+                 max_backoff=64.0,
+                 secret_params=ResponseCache.SECRET_PARAMS):
+        self.host_rates = dict(host_rates or {})
+        self.credential_rates = dict(credential_rates or {})
+        self.default_rate = default_rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.secret_params = set(secret_params)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, rate):
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(rate)
+            return self._buckets[key]
+
+    def buckets(self, request):
+        """Return the buckets `request` draws from"""
+        parts = urlsplit(request.url)
+        host = parts.netloc.lower()
+        credential = request.headers.get('Authorization', '') + ''.join(
+            value for name, value in parse_qsl(parts.query)
+            if name.lower() in self.secret_params)
+        buckets = []
+        rate = self.host_rates.get(host, self.default_rate)
+        if rate is not None:
+            buckets.append(self._bucket(host, rate))
+        rate = self.credential_rates.get(host, self.default_rate)
+        if credential and rate is not None:
+            credential = hashlib.sha256(credential.encode()).hexdigest()
+            buckets.append(self._bucket((host, credential), rate))
+        return buckets
+
+    def wait(self, request):
+        """Block until `request` may be sent"""
+        delay = max((bucket.reserve() for bucket in self.buckets(request)),
+                    default=0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def retry_after(self, response):
+        """Return the seconds the server asks to wait, or None"""
+        headers = response.headers
+        if 'Retry-After' in headers:
+            value = headers['Retry-After']
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp()
+                           - time.time(), 0.0)
+        if 'x-rate-limit-reset' in headers:
+            return max(float(headers['x-rate-limit-reset']) - time.time(),
+                       0.0)
+        return None
+
+    def observe(self, request, response, attempt):
+        """Update the buckets from `response`
+
+        Returns
+        -------
+        float or None
+            Seconds to wait before retrying `request`, or None if
+            `response` is final
+        """
+
+        buckets = self.buckets(request)
+        if response.status_code not in self.RETRY_STATUSES:
+            if (response.headers.get('x-rate-limit-remaining') == '0'
+                    and 'x-rate-limit-reset' in response.headers):
+                for bucket in buckets:
+                    bucket.pause(self.retry_after(response))
+            return None
+        if attempt >= self.max_retries or (
+                request.method in self.UNSAFE_METHODS
+                and response.status_code != 429):
+            return None
+        delay = self.retry_after(response)
+        if delay is None:
+            delay = min(self.max_backoff, self.backoff * 2**attempt)
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        else:
+            delay += random.uniform(0, self.backoff)
+        for bucket in buckets:
+            bucket.pause(delay)
+        return delay
+
+class CachedSession(requests.Session):
+    """requests Session answering GET requests from a `ResponseCache`
+
+    Cached responses carry `from_cache = True`. Streaming requests and
+    methods other than GET skip the cache, and so do lookups of requests
+    sent with `Cache-Control: no-cache`. Requests reaching the network are
+    throttled and retried by the `RateLimiter`, if any.
+
+    Parameters
+    ----------
+    cache : ResponseCache, optional
+        Cache of the GET responses
+    limiter : RateLimiter, optional
+        Rate limiter shared with other sessions
+    """
+
+    def __init__(self, cache=None, limiter=None):
+        super().__init__()
+        self.cache = cache
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        if (self.cache is None or request.method != 'GET'
+                or kwargs.get('stream')):
+            return self._send(request, **kwargs)
+        entry = None
+        if 'no-cache' not in request.headers.get('Cache-Control', ''):
+            entry = self.cache.get(request.url)
+        if entry is not None and self.cache.is_fresh(request.url, entry):
+            self.cache.count('hits')
+            return self._from_entry(entry, request)
+        if entry is not None:
+            headers = CaseInsensitiveDict(entry['headers'])
+            if 'ETag' in headers:
+                request.headers['If-None-Match'] = headers['ETag']
+            if 'Last-Modified' in headers:
+                request.headers['If-Modified-Since'] = headers['Last-Modified']
+        response = self._send(request, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self.cache.refresh(request.url)
+            self.cache.count('revalidations')
+            return self._from_entry(entry, request)
+        self.cache.count('misses')
+        if response.status_code == 200:
+            self.cache.set(request.url, response)
+        return response
+
+    def _send(self, request, **kwargs):
+        if self.limiter is None:
+            return super().send(request, **kwargs)
+        attempt = 0
+        while True:
+            self.limiter.wait(request)
+            response = super().send(request, **kwargs)
+            delay = self.limiter.observe(request, response, attempt)
+            if delay is None:
+                return response
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _from_entry(entry, request):
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers)
+        response._content = entry['content']
+        response.url = request.url
+        response.request = request
+        response.from_cache = True
+        return response
+
+cache = ResponseCache('api_cache.sqlite', ttls={
+    'https://en.wikipedia.org/w/api.php': 7 * 24 * 3600,
+    'https://www.googleapis.com/youtube/': 3600,
+    'https://api.twitter.com/': 15 * 60,
+})
+limiter = RateLimiter(host_rates={
+    'en.wikipedia.org': 20,
+    'www.googleapis.com': 10,
+    'api.twitter.com': 5,
+}, credential_rates={
+    'api.twitter.com': 1,
+})
+session = CachedSession(cache, limiter)
+
+class MediaWikiClient:
+    """Streaming client of the MediaWiki query API
+
+    All requests go through one persistent `requests.Session`, so a long
+    crawl reuses the same connection.
+
+    Parameters
+    ----------
+    endpoint : str, optional
+        URL of the `api.php` of the wiki
+    session : requests.Session, optional
+        Session to send the requests with
+    """
+
+    def __init__(self, endpoint='https://en.wikipedia.org/w/api.php',
+                 session=None):
+        self.endpoint = endpoint
+        self.session = session or requests.Session()
+
+    def query(self, **params):
+        """Return the JSON response of a single `action=query` request"""
+        params = {'action': 'query', 'format': 'json', **params}
+        return self.session.get(self.endpoint, params=params).json()
+
+    def iter_query(self, **params):
+        """Yield every response of a query, following `continue`"""
+        while True:
+            response = self.query(**params)
+            yield response
+            if 'continue' not in response:
+                break
+            params.update(response['continue'])
+
+    def iter_revisions(self, rvprop=None, **params):
+        """Yield the revisions of a page one response at a time
+
+        Parameters
+        ----------
+        rvprop : str or sequence of str, optional
+            Revision fields to request, such as 'ids|user|timestamp'
+        **params
+            Other query parameters, such as `titles`, `rvstart` and
+            `rvlimit`
+
+        Yields
+        ------
+        list of dict
+            Revisions of one response
+        """
+
+        params['prop'] = 'revisions'
+        if rvprop is not None:
+            params['rvprop'] = (rvprop if isinstance(rvprop, str)
+                                else '|'.join(rvprop))
+        for response in self.iter_query(**params):
+            for page in response['query']['pages'].values():
+                yield page.get('revisions', [])
+
+    def revisions_frame(self, columns=None, path=None, **params):
+        """Collect the revisions of a page into a DataFrame or Parquet file
+
+        Each response is turned into a columnar batch as it arrives. With
+        `path`, the batches are appended to a Parquet file (requires
+        pyarrow) so memory stays constant whatever the page history length.
+
+        Parameters
+        ----------
+        columns : sequence of str, optional
+            Columns to keep; defaults to those of the first batch
+        path : str, optional
+            Parquet file to write the revisions to
+        **params
+            Passed to `iter_revisions`
+
+        Returns
+        -------
+        pandas DataFrame or str
+            The revisions, or `path` if given
+        """
+
+        frames = []
+        writer = None
+        try:
+            for batch in self.iter_revisions(**params):
+                frame = pd.DataFrame(batch)
+                if columns is None:
+                    columns = list(frame.columns)
+                frame = frame.reindex(columns=columns)
+                if path is None:
+                    frames.append(frame)
+                    continue
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                if writer is None:
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    writer = pq.ParquetWriter(path, table.schema)
+                else:
+                    table = pa.Table.from_pandas(
+                        frame, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        if path is not None:
+            return path
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+wiki = MediaWikiClient(session=session)
+
 def get_revisions_timeseries():
     """
     The function returns a pandas Series with index eqial to months in
@@ -140,31 +671,62 @@ def get_revisions_timeseries():
     Sorted by chronological order.
     """
 
-    revs = []
-    params = {
-        'action': 'query',
-        'prop': 'revisions',
-        'titles': 'Data science',
-        'rvstart': '2022-10-01T00:00:00Z',
-        'rvprop': 'timestamp',
-        'rvlimit': 'max',
-        'format': 'json',
-    }
-    while True:
-        response = (requests
-                    .get(
-                        'https://en.wikipedia.org/w/api.php',
-                        params=params
-                    )
-                    .json())
-        revs.extend(
-            list(response['query']['pages'].values())[0]['revisions'])
-        if 'continue' in response:
-            params.update(response['continue'])
-        else:
-            break
-    df = pd.DataFrame(revs)
-    return df.groupby(df.timestamp.str[0:7]).size()
+    counts = pd.Series(dtype='int64')
+    for batch in wiki.iter_revisions(titles='Data science',
+                                     rvstart='2022-10-01T00:00:00Z',
+                                     rvprop='timestamp', rvlimit='max'):
+        months = pd.Series([rev['timestamp'][0:7] for rev in batch])
+        counts = counts.add(months.value_counts(), fill_value=0)
+    counts = counts.astype('int64').sort_index()
+    counts.index.name = 'timestamp'
+    return counts
+
+from concurrent.futures import ThreadPoolExecutor
+
+def _revision_asof(title, cutoff):
+    """Return the newest revision of `title` at or before `cutoff`"""
+    response = wiki.query(titles=title, prop='revisions',
+                          rvprop='ids|timestamp', rvstart=cutoff, rvlimit=1)
+    page = list(response['query']['pages'].values())[0]
+    revisions = page.get('revisions', [])
+    return revisions[0] if revisions else {}
+
+def revisions_asof(titles, cutoff, max_workers=8):
+    """Resolve the revision of each title as of a cutoff time
+
+    MediaWiki only accepts `rvstart` and `rvlimit` for a single page, so
+    each title costs one request that returns just the newest revision
+    before the cutoff. Up to `max_workers` of those run concurrently.
+
+    Parameters
+    ----------
+    titles : sequence of str
+        Page titles
+    cutoff : str
+        UTC cutoff time, such as '2022-09-01T00:00:00Z'
+    max_workers : int, optional
+        Maximum number of requests in flight
+
+    Returns
+    -------
+    pandas DataFrame
+        Columns title, revid and timestamp of the titles that existed as
+        of the cutoff
+    """
+
+    titles = list(titles)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        revisions = list(executor.map(
+            lambda title: _revision_asof(title, cutoff), titles))
+    df = pd.DataFrame({
+        'title': titles,
+        'revid': [rev.get('revid') for rev in revisions],
+        'timestamp': pd.to_datetime(
+            [rev.get('timestamp') for rev in revisions], utc=True,
+            format='%Y-%m-%dT%H:%M:%SZ'),
+    })
+    df = df[df['timestamp'] <= pd.Timestamp(cutoff)]
+    return df.astype({'revid': 'int64'}).reset_index(drop=True)
 
 def get_foobar_link_revs_asof():
     """
@@ -173,46 +735,13 @@ def get_foobar_link_revs_asof():
     English Wikipedia.
     """
 
-    sept_date = datetime(2022, 9, 1)
-    params = {
-        'action': 'query',
-        'revids': '1114361016',
-        'prop': 'links',
-        'pllimit': 'max',
-        'format': 'json'
-    }
-    response = (requests
-                .get(
-                    'https://en.wikipedia.org/w/api.php',
-                    params=params
-                )
-                .json())
-    title = list(response['query']['pages'].values())[0]['links']
-    rev_ids = []
-    for i in title:
-        if i['ns'] == 0:
-            new_title = i['title']
-            params = {
-                'action': 'query',
-                'titles': new_title,
-                'prop': 'revisions',
-                'rvlimit': 'max',
-                'format': 'json'
-            }
-            response = (requests
-                        .get(
-                            'https://en.wikipedia.org/w/api.php',
-                            params=params
-                        )
-                        .json())
-            my_ls = list(response['query']['pages'].values())[0]['revisions']
-            for i in my_ls:
-                new_date = pd.to_datetime(
-                    i['timestamp'], format="%Y-%m-%dT%H:%M:%SZ")
-                if new_date <= sept_date:
-                    rev_ids.append(i['revid'])
-                    break
-    return sorted(rev_ids)
+    titles = []
+    for response in wiki.iter_query(revids='1114361016', prop='links',
+                                    plnamespace=0, pllimit='max'):
+        for page in response['query']['pages'].values():
+            titles.extend(link['title'] for link in page.get('links', []))
+    df = revisions_asof(titles, '2022-09-01T00:00:00Z')
+    return sorted(df['revid'].tolist())
 
 def followed_accounts(username, bearer_token):
     """
@@ -224,14 +753,16 @@ def followed_accounts(username, bearer_token):
     headers = {'Authorization': f'Bearer {bearer_token}'}
     url = f'https://api.twitter.com/2/users/by/username/{username}'
     params = {'user.fields': 'id'}
-    response = (requests.get(url, headers=headers, params=params).json())
-    userid = response['data']['id']
+    response = session.get(url, headers=headers, params=params)
+    response.raise_for_status()
+    userid = response.json()['data']['id']
     url = f'https://api.twitter.com/2/users/{userid}/following'
     params = {'max_results': 1000,
               'user.fields': 'id,username,name,location,created_at'
               }
-    resp = (requests.get(url, headers=headers, params=params).json())
-    df = pd.DataFrame(resp['data']).astype({'id': 'int'}).sort_values('id')
+    resp = session.get(url, headers=headers, params=params)
+    resp.raise_for_status()
+    df = pd.DataFrame(resp.json()['data']).astype({'id': 'int'}).sort_values('id')
     return df[['id', 'username', 'name', 'location', 'created_at']]
 
 def user_videos(channel_id, api_key):
@@ -253,12 +784,13 @@ def user_videos(channel_id, api_key):
         'maxResults': 50
     }
     while True:
-        response = (requests
+        response = (session
                     .get(
                         'https://www.googleapis.com/youtube/v3/search',
                         params=params
-                    )
-                    .json())
+                    ))
+        response.raise_for_status()
+        response = response.json()
         videos.extend(response['items'])
         if 'nextPageToken' in response:
             params.update({'pageToken': response['nextPageToken']})
@@ -2,16 +2,68 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from collections import Counter
+from scipy.sparse import csr_matrix, issparse, vstack
 from IPython.display import display, display_html
 
-def label_encode(ord_values, value_mapping):
+def label_encode(ord_values, value_mapping, unknown='error',
+                 unknown_value=-1):
     """
     The function accepts a list of ordinal values and returns their label
     encoded values as list.
+
+    NumPy arrays, pandas Series and Categoricals are also accepted and
+    return a NumPy array using the smallest integer type that holds the
+    labels. Only the distinct values (or the categories of a Categorical)
+    are looked up in `value_mapping`, and the codes of every element are
+    then mapped in one step. Values missing from `value_mapping` raise a
+    KeyError if `unknown='error'` or are encoded as `unknown_value` if
+    `unknown='value'`.
+
+    The large speedup needs categorical or integer input: object and
+    string arrays are hashed element by element and gain only about 2x,
+    and lists are still encoded with a plain comprehension, which is
+    faster for them than converting to an array.
     """
 
-    lst = [value_mapping[i] for i in ord_values]
-    return lst
+    if unknown not in ('error', 'value'):
+        raise ValueError("unknown must be 'error' or 'value'")
+    if isinstance(ord_values, list):
+        if unknown == 'error':
+            return [value_mapping[i] for i in ord_values]
+        return [value_mapping.get(i, unknown_value) for i in ord_values]
+    keys = list(value_mapping)
+    labels = list(value_mapping.values())
+    if unknown == 'value':
+        labels.append(unknown_value)
+    labels = np.array(labels)
+    if len(labels) and np.issubdtype(labels.dtype, np.integer):
+        low, high = labels.min(), labels.max()
+        if low >= 0:
+            labels = labels.astype(np.min_scalar_type(high))
+        else:
+            labels = labels.astype(np.result_type(
+                np.min_scalar_type(low), np.min_scalar_type(-high - 1)))
+
+    if isinstance(getattr(ord_values, 'dtype', None), pd.CategoricalDtype):
+        cat = getattr(ord_values, 'array', ord_values)
+        codes, uniques = cat.codes, cat.categories
+    elif isinstance(ord_values, np.ndarray):
+        codes, uniques = pd.factorize(ord_values)
+    else:
+        codes, uniques = pd.factorize(pd.Series(ord_values))
+    # One label per distinct value, plus a last one for missing values
+    # (code -1); unknown values also point at it, i.e. at `unknown_value`
+    index = pd.Index(keys).get_indexer(uniques)
+    if unknown == 'error':
+        unknown_codes = np.flatnonzero(index < 0)
+        missing = codes < 0
+        if len(unknown_codes):
+            missing |= np.isin(codes, unknown_codes)
+        if missing.any():
+            first = np.flatnonzero(missing)[0]
+            raise KeyError(np.asarray(ord_values, dtype=object)[first])
+    table = labels[np.append(index, -1)] if len(labels) else labels
+    return table[codes]
 
 from sklearn.preprocessing import OneHotEncoder
 def onehot_encode(cat_values):
@@ -43,6 +95,159 @@ def vectorize_people(people, value_mappings):
     vect = pd.get_dummies(df, drop_first=True)
     return vect.reindex(sorted(vect.columns), axis=1)
 
+class CategoricalEncoder:
+    """Encode people (or any records) the way `vectorize_people` does
+
+    The encoder remembers the output columns learned by `fit`, so every
+    batch passed to `transform` is encoded into the same columns. Ordinal
+    columns are mapped through `value_mappings`, other text columns are
+    one-hot encoded with their first category dropped, and numeric columns
+    are passed through. Columns are sorted alphabetically by `fit`;
+    categories first seen by `partial_fit` get new columns appended at the
+    end so existing columns never move.
+
+    Parameters
+    ----------
+    value_mappings : dict of dicts, optional
+        Mapping of ordinal values for each ordinal column
+    """
+
+    def __init__(self, value_mappings=None):
+        self.value_mappings = dict(value_mappings or {})
+        self.columns = []
+        self.categories = {}
+        self.category_columns = {}
+        self.value_columns = {}
+
+    def _to_frame(self, people):
+        """Return people as a pandas DataFrame"""
+        if isinstance(people, pd.DataFrame):
+            return people
+        return pd.DataFrame(people)
+
+    def _is_categorical(self, series):
+        """Return whether series is one-hot encoded"""
+        return (series.name not in self.value_mappings
+                and (pd.api.types.is_object_dtype(series)
+                     or pd.api.types.is_string_dtype(series)
+                     or isinstance(series.dtype, pd.CategoricalDtype)))
+
+    def fit(self, people):
+        """Learn the output columns of people
+
+        Parameters
+        ----------
+        people : list of dict or pandas DataFrame
+            Records to learn the categories from
+
+        Returns
+        -------
+        self : CategoricalEncoder
+        """
+
+        df = self._to_frame(people)
+        self.categories = {}
+        value_columns = []
+        dummies = []
+        for col in df.columns:
+            if self._is_categorical(df[col]):
+                cats = sorted(df[col].dropna().unique())
+                self.categories[col] = cats
+                dummies.extend((col, cat) for cat in cats[1:])
+            else:
+                value_columns.append(col)
+        names = {f'{col}_{cat}': (col, cat) for col, cat in dummies}
+        names.update({col: col for col in value_columns})
+        self.columns = sorted(names, key=str)
+        self.value_columns = {}
+        self.category_columns = {col: {} for col in self.categories}
+        for j, name in enumerate(self.columns):
+            source = names[name]
+            if isinstance(source, tuple):
+                self.category_columns[source[0]][source[1]] = j
+            else:
+                self.value_columns[source] = j
+        return self
+
+    def partial_fit(self, people):
+        """Add the categories of people not seen yet as new columns
+
+        Parameters
+        ----------
+        people : list of dict or pandas DataFrame
+            Records to learn new categories from
+
+        Returns
+        -------
+        self : CategoricalEncoder
+        """
+
+        if not self.columns:
+            return self.fit(people)
+        df = self._to_frame(people)
+        for col, cats in self.categories.items():
+            if col not in df:
+                continue
+            new = sorted(set(df[col].dropna().unique()) - set(cats))
+            for cat in new:
+                cats.append(cat)
+                self.category_columns[col][cat] = len(self.columns)
+                self.columns.append(f'{col}_{cat}')
+        return self
+
+    def transform(self, people):
+        """Return the design matrix of people
+
+        Categories unseen during fitting are encoded as all zeros and
+        unmapped ordinal values as NaN, like in `vectorize_people`.
+
+        Parameters
+        ----------
+        people : list of dict or pandas DataFrame
+            Records to encode
+
+        Returns
+        -------
+        X : csr_matrix
+            Design matrix with columns given by `columns`
+        """
+
+        df = self._to_frame(people)
+        n_rows = len(df)
+        rows, cols, data = [], [], []
+        for col, j in self.value_columns.items():
+            if col in self.value_mappings:
+                mapping = self.value_mappings[col]
+                codes = pd.Categorical(df[col],
+                                       categories=list(mapping)).codes
+                lookup = np.append(
+                    np.array(list(mapping.values()), dtype=float), np.nan)
+                values = lookup[codes]
+            else:
+                values = df[col].to_numpy(dtype=float)
+            nonzero = np.flatnonzero(values != 0)
+            rows.append(nonzero)
+            cols.append(np.full(len(nonzero), j))
+            data.append(values[nonzero])
+        for col, cats in self.categories.items():
+            lookup = np.array(
+                [self.category_columns[col].get(cat, -1) for cat in cats]
+                + [-1])
+            out = lookup[pd.Categorical(df[col], categories=cats).codes]
+            hit = np.flatnonzero(out >= 0)
+            rows.append(hit)
+            cols.append(out[hit])
+            data.append(np.ones(len(hit)))
+        return csr_matrix(
+            (np.concatenate(data) if data else [],
+             (np.concatenate(rows) if rows else [],
+              np.concatenate(cols) if cols else [])),
+            shape=(n_rows, len(self.columns)))
+
+    def fit_transform(self, people):
+        """Fit on people and return their design matrix"""
+        return self.fit(people).transform(people)
+
 def get_wine_df(data_wine):
     """
     The function accepts a bunch of objects and returns the
@@ -52,16 +257,59 @@ def get_wine_df(data_wine):
     cols = data_wine['feature_names']
     return pd.DataFrame(data_wine['data'], columns=cols)
 
-def to_bow(docs):
+def to_bow(docs, sparse=False, batch_size=10000, min_df=1,
+           max_features=None):
     """
     The function accepts a list of documents and returns a pandas DataFrame
     of their bag-of-words representation. Sort columns alphabetically.
+
+    With `sparse=True`, `docs` may be any iterable of documents and is read
+    once, `batch_size` documents at a time. The function then returns a
+    tuple of a sparse CSR document-term matrix and the alphabetically sorted
+    list of words corresponding to its columns. Words appearing in fewer
+    than `min_df` documents are dropped and, if `max_features` is given,
+    only that many words with the highest total count are kept.
     """
 
-    docs = [doc.lower() for doc in docs]
-    df = pd.DataFrame([Counter(doc.split()) for doc in docs])
-    df.fillna(0, inplace=True)
-    return df.reindex(sorted(df.columns), axis=1)
+    if not sparse:
+        docs = [doc.lower() for doc in docs]
+        df = pd.DataFrame([Counter(doc.split()) for doc in docs])
+        df.fillna(0, inplace=True)
+        return df.reindex(sorted(df.columns), axis=1)
+
+    vocab = {}
+    batches = []
+    indices, data, indptr = [], [], [0]
+    for doc in docs:
+        for word, count in Counter(doc.lower().split()).items():
+            indices.append(vocab.setdefault(word, len(vocab)))
+            data.append(count)
+        indptr.append(len(indices))
+        if len(indptr) > batch_size:
+            batches.append((np.array(data, dtype=float),
+                            np.array(indices, dtype=np.int64),
+                            np.array(indptr, dtype=np.int64)))
+            indices, data, indptr = [], [], [0]
+    if len(indptr) > 1:
+        batches.append((np.array(data, dtype=float),
+                        np.array(indices, dtype=np.int64),
+                        np.array(indptr, dtype=np.int64)))
+
+    n_words = len(vocab)
+    if batches:
+        X = vstack([csr_matrix(batch, shape=(len(batch[2]) - 1, n_words))
+                    for batch in batches], format='csr')
+    else:
+        X = csr_matrix((0, n_words))
+    words = np.array(list(vocab), dtype=object)
+    keep = np.flatnonzero(np.bincount(X.indices, minlength=n_words) >= min_df)
+    if max_features is not None and len(keep) > max_features:
+        totals = np.asarray(X.sum(axis=0)).ravel()
+        keep = keep[np.argsort(-totals[keep], kind='stable')[:max_features]]
+    keep = keep[np.argsort(words[keep].astype(str), kind='stable')]
+    X = X[:, keep]
+    X.sort_indices()
+    return X, words[keep].tolist()
 
 def lpnorm(vec1, vec2, p=2):
     """Compute the L_p-norm distance between vec1 and vec2
@@ -112,7 +360,7 @@ def cossim(vec1, vec2):
         return (np.dot(vec1, vec2) /
                 (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
     else:
-        return (np.dot(vec1, vec2) /
+        return (np.sum(vec1 * vec2, axis=1) /
                 (np.linalg.norm(vec1, axis=1) * np.linalg.norm(vec2, axis=1)))
 
 def dcos(vec1, vec2):
@@ -159,12 +407,180 @@ def nearest_k(query, objects, k, dist):
         Indices to the most similar objects in the database
     """
 
-    return np.argsort([dist(query, obj) for obj in objects])[:k]
+    return nearest_k_batch(query, objects, k, dist)[0]
+
+def _row_sq_norms(X):
+    """Return the squared L2 norm of each row of a dense or sparse matrix"""
+    if issparse(X):
+        return np.asarray(X.multiply(X).sum(axis=1)).ravel()
+    return (X**2).sum(axis=1)
+
+def _block_dist(queries, objects, dist, q_sq=None, o_sq=None):
+    """Return the distance of every query to every object as a matrix
+
+    `lpnorm` (with its default p=2), `cossim` and `dcos` are computed with
+    matrix products and also accept sparse `objects`; any other `dist` is
+    called once per pair. `q_sq` and `o_sq` are the squared row norms of
+    `queries` and `objects`, if already known.
+    """
+
+    if dist is lpnorm or dist is cossim or dist is dcos:
+        if q_sq is None:
+            q_sq = _row_sq_norms(queries)
+        if o_sq is None:
+            o_sq = _row_sq_norms(objects)
+        dot = (objects @ queries.T).T
+    if dist is lpnorm:
+        sq = q_sq[:, np.newaxis] + o_sq[np.newaxis, :] - 2 * dot
+        return np.sqrt(np.maximum(sq, 0))
+    elif dist is cossim or dist is dcos:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sim = (dot / np.sqrt(q_sq)[:, np.newaxis]
+                   / np.sqrt(o_sq)[np.newaxis, :])
+        return sim if dist is cossim else 1 - sim
+    else:
+        if issparse(objects):
+            objects = objects.toarray()
+        return np.array([[dist(query, obj) for obj in objects]
+                         for query in queries], dtype=float)
+
+def _top_k(queries, objects, k, dist, chunk_size, q_sq=None, o_sq=None):
+    """Return the indices and distances of the `k` objects nearest each query
+
+    The objects are scanned `chunk_size` rows at a time and only the best `k`
+    candidates of each query are kept between chunks.
+    """
+
+    n_objects = objects.shape[0]
+    k = min(k, n_objects)
+    best_dist = np.empty((len(queries), 0))
+    best_idx = np.empty((len(queries), 0), dtype=int)
+    for start in range(0, n_objects, chunk_size):
+        stop = start + chunk_size
+        block = _block_dist(queries, objects[start:stop], dist, q_sq,
+                            None if o_sq is None else o_sq[start:stop])
+        idx = np.arange(start, start + block.shape[1])
+        best_dist = np.hstack([best_dist, block])
+        best_idx = np.hstack([best_idx, np.broadcast_to(idx, block.shape)])
+        if best_dist.shape[1] > k:
+            top = np.argpartition(best_dist, k - 1, axis=1)[:, :k]
+            best_dist = np.take_along_axis(best_dist, top, axis=1)
+            best_idx = np.take_along_axis(best_idx, top, axis=1)
+    order = np.argsort(best_dist, axis=1, kind='stable')
+    return (np.take_along_axis(best_idx, order, axis=1),
+            np.take_along_axis(best_dist, order, axis=1))
+
+def nearest_k_batch(queries, objects, k, dist, chunk_size=10000):
+    """Return the indices to objects most similar to each query
+
+    The objects are scanned `chunk_size` rows at a time and only the best `k`
+    candidates of each query are kept between chunks, so memory stays at
+    about ``len(queries) * (chunk_size + k)`` distances.
+
+    Parameters
+    ----------
+    queries : ndarray
+        query objects, one per row, in the same vector representation as the
+        objects; a single 1-D query is also accepted
+    objects : ndarray
+        vector-represented objects in the database; rows correspond to
+        objects, columns correspond to features
+    k : int
+        number of most similar objects to return per query
+    dist : function
+        accepts two ndarrays as parameters then returns their distance
+    chunk_size : int, optional
+        number of objects to compare against the queries at a time
+
+    Returns
+    -------
+    ndarray
+        Indices to the most similar objects in the database; row `i` holds
+        the results of query `i`, closest first
+    """
+
+    queries = np.atleast_2d(np.asarray(queries, dtype=float))
+    return _top_k(queries, objects, k, dist, chunk_size)[0]
+
+from concurrent.futures import ThreadPoolExecutor
+def pairwise(X, Y=None, metric=lpnorm, k=None, block_size=1024,
+             dtype=np.float64, n_jobs=1):
+    """Compute the distance of every row of X to every row of Y
+
+    The rows of `X` are processed `block_size` at a time. For `lpnorm` the
+    squared distances come from ``||x||^2 + ||y||^2 - 2 x.y`` and for
+    `cossim` and `dcos` the dot products are divided by row norms computed
+    once for the whole of `X` and `Y`, so each tile is a single matrix
+    product. Tiles are independent and can be spread over `n_jobs` threads.
+
+    Parameters
+    ----------
+    X : ndarray or sparse matrix
+        First set of vectors; rows correspond to objects
+    Y : ndarray or sparse matrix, optional
+        Second set of vectors; defaults to `X`
+    metric : function, optional
+        `lpnorm`, `cossim`, `dcos` or any function accepting two ndarrays
+        and returning their distance
+    k : int, optional
+        If given, only keep the `k` nearest rows of `Y` for each row of `X`
+    block_size : int, optional
+        Number of rows of `X` (and, with `k`, of `Y`) per tile
+    dtype : dtype, optional
+        Floating point type used for the computation and the result
+    n_jobs : int, optional
+        Number of threads computing tiles concurrently
+
+    Returns
+    -------
+    ndarray or tuple of ndarray
+        The ``(len(X), len(Y))`` distance matrix or, if `k` is given, the
+        ``(len(X), k)`` indices to the nearest rows of `Y` and their
+        distances, closest first
+    """
+
+    X = X.astype(dtype) if issparse(X) else np.asarray(X, dtype=dtype)
+    if Y is None:
+        Y = X
+    else:
+        Y = Y.astype(dtype) if issparse(Y) else np.asarray(Y, dtype=dtype)
+    x_sq = _row_sq_norms(X)
+    y_sq = _row_sq_norms(Y)
+    n_x, n_y = X.shape[0], Y.shape[0]
+    if k is None:
+        out = np.empty((n_x, n_y), dtype=dtype)
+    else:
+        k = min(k, n_y)
+        out = (np.empty((n_x, k), dtype=int), np.empty((n_x, k), dtype=dtype))
+
+    def fill(start):
+        stop = start + block_size
+        rows = X[start:stop]
+        if issparse(rows):
+            rows = rows.toarray()
+        if k is None:
+            out[start:stop] = _block_dist(rows, Y, metric,
+                                          x_sq[start:stop], y_sq)
+        else:
+            idx, dist = _top_k(rows, Y, k, metric, block_size,
+                               x_sq[start:stop], y_sq)
+            out[0][start:stop] = idx
+            out[1][start:stop] = dist
+
+    starts = range(0, n_x, block_size)
+    if n_jobs == 1:
+        for start in starts:
+            fill(start)
+    else:
+        with ThreadPoolExecutor(n_jobs) as pool:
+            list(pool.map(fill, starts))
+    return out
 
 class Vectorizer:
     def __init__(self):
         self.index_word = {}
         self.word_index = {}
+        self.word_column = {}
 
     def build_mappings(self, docs):
         """Initialize word-index mappings
@@ -178,24 +594,414 @@ class Vectorizer:
         self.index_word = {i: word for i, word in enumerate(words)}
         self.word_index = {
             word.lower(): i for i, word in self.index_word.items()}
+        self.word_column = {
+            word: j for j, word in enumerate(sorted(self.word_index))}
 
-    def vectorize(self, doc):
+    def vectorize(self, doc, sparse=False):
         """Return the BoW vector representation of doc
 
         Parameters
         ----------
         doc : str
             Text to compute the vector representation of
+        sparse : bool, optional
+            Return a 1-row `scipy.sparse` CSR matrix instead of an ndarray
 
         Returns
         -------
-        vec : ndarray
+        vec : ndarray or csr_matrix
             BoW vector representation of doc
         """
 
-        words = dict.fromkeys(self.word_index, 0)
-        freq = Counter(doc.lower().split())
-        for i in freq.keys():
-            if i in words.keys():
-                words[i] = freq[i]
-        return pd.Series(words).sort_index().values.astype(float)
\ No newline at end of file
+        if sparse:
+            return self.vectorize_many([doc])
+        vec = np.zeros(len(self.word_column))
+        for word, count in Counter(doc.lower().split()).items():
+            j = self.word_column.get(word)
+            if j is not None:
+                vec[j] = count
+        return vec
+
+    def vectorize_many(self, docs):
+        """Return the BoW matrix representation of docs
+
+        Only the words present in each document are touched, so the cost is
+        proportional to the total number of tokens rather than to the size
+        of the vocabulary.
+
+        Parameters
+        ----------
+        docs : iterable of str
+            Texts to compute the vector representation of
+
+        Returns
+        -------
+        X : csr_matrix
+            BoW representation of docs; rows correspond to documents and
+            columns to the same features as `vectorize`
+        """
+
+        indptr = [0]
+        indices = []
+        data = []
+        for doc in docs:
+            freq = Counter(doc.lower().split())
+            for word, count in freq.items():
+                j = self.word_column.get(word)
+                if j is not None:
+                    indices.append(j)
+                    data.append(count)
+            indptr.append(len(indices))
+        X = csr_matrix((np.array(data, dtype=float),
+                        np.array(indices, dtype=np.int64),
+                        np.array(indptr, dtype=np.int64)),
+                       shape=(len(indptr) - 1, len(self.word_column)))
+        X.sort_indices()
+        return X
+import os
+import json
+class IVFIndex:
+    """Approximate nearest-neighbour index with inverted lists
+
+    The objects are clustered with k-means into `n_lists` cells and stored
+    grouped by cell. A search only scans the `n_probe` cells whose centroids
+    are nearest the query, trading recall for speed.
+
+    Parameters
+    ----------
+    n_lists : int, optional
+        Number of k-means cells
+    metric : function, optional
+        `lpnorm` or `dcos`; use `dcos` to rank by cosine similarity
+    n_iter : int, optional
+        Number of k-means iterations
+    sample_size : int, optional
+        Number of objects the k-means centroids are trained on
+    chunk_size : int, optional
+        Number of objects assigned to cells at a time
+    seed : int, optional
+        Seed of the random sample and initial centroids
+    """
+
+    metrics = {'lpnorm': lpnorm, 'dcos': dcos}
+
+    def __init__(self, n_lists=100, metric=lpnorm, n_iter=10,
+                 sample_size=100000, chunk_size=10000, seed=0):
+        if metric not in self.metrics.values():
+            raise ValueError('metric must be lpnorm or dcos')
+        self.n_lists = n_lists
+        self.metric = metric
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+    def _assign(self, X):
+        """Return the index of the nearest centroid of each row of X"""
+        labels = np.empty(X.shape[0], dtype=np.int64)
+        for start in range(0, X.shape[0], self.chunk_size):
+            block = _block_dist(self.centroids,
+                                X[start:start + self.chunk_size],
+                                self.metric)
+            labels[start:start + self.chunk_size] = np.argmin(
+                np.nan_to_num(block, nan=np.inf), axis=0)
+        return labels
+
+    def fit(self, X):
+        """Cluster and store the objects
+
+        Parameters
+        ----------
+        X : ndarray or csr_matrix
+            Design matrix, such as the output of `Vectorizer.vectorize_many`
+            or `TFIDF`; rows correspond to objects
+
+        Returns
+        -------
+        self : IVFIndex
+        """
+
+        X = X.astype(np.float32) if issparse(X) else np.asarray(
+            X, dtype=np.float32)
+        n_objects = X.shape[0]
+        n_lists = min(self.n_lists, n_objects)
+        rng = np.random.default_rng(self.seed)
+        sample = X[np.sort(rng.choice(
+            n_objects, min(self.sample_size, n_objects), replace=False))]
+        init = rng.choice(sample.shape[0], n_lists, replace=False)
+        centroids = sample[init]
+        self.centroids = (centroids.toarray() if issparse(centroids)
+                          else np.array(centroids))
+        for _ in range(self.n_iter):
+            labels = self._assign(sample)
+            members = csr_matrix(
+                (np.ones(len(labels), dtype=np.float32),
+                 (labels, np.arange(len(labels)))),
+                shape=(n_lists, sample.shape[0]))
+            sums = members @ sample
+            sums = sums.toarray() if issparse(sums) else np.asarray(sums)
+            counts = np.bincount(labels, minlength=n_lists)
+            filled = counts > 0
+            self.centroids[filled] = sums[filled] / counts[filled, np.newaxis]
+
+        labels = self._assign(X)
+        self.ids = np.argsort(labels, kind='stable')
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+        self.vectors = X[self.ids]
+        return self
+
+    def search(self, queries, k, n_probe=1):
+        """Return the indices to the objects nearest each query
+
+        Parameters
+        ----------
+        queries : ndarray or csr_matrix
+            Query objects, one per row; a single 1-D query is also accepted
+        k : int
+            Number of objects to return per query
+        n_probe : int, optional
+            Number of nearest cells to scan; higher is slower but more
+            accurate, and ``n_probe=n_lists`` is an exact search
+
+        Returns
+        -------
+        ndarray
+            Indices to the nearest objects, closest first; row `i` holds the
+            results of query `i` and is padded with -1 if the probed cells
+            hold fewer than `k` objects
+        """
+
+        if issparse(queries):
+            queries = queries.toarray()
+        queries = np.atleast_2d(np.asarray(queries, dtype=float))
+        n_probe = min(n_probe, len(self.centroids))
+        probes = _top_k(queries, self.centroids, n_probe, self.metric,
+                        self.chunk_size)[0]
+        results = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, (query, cells) in enumerate(zip(queries, probes)):
+            rows = np.concatenate([
+                np.arange(self.offsets[c], self.offsets[c + 1])
+                for c in cells])
+            if len(rows) == 0:
+                continue
+            idx = _top_k(query[np.newaxis], self.vectors[rows], k,
+                         self.metric, self.chunk_size)[0][0]
+            results[i, :len(idx)] = self.ids[rows[idx]]
+        return results
+
+    def recall(self, queries, k, n_probe=1):
+        """Return the fraction of the exact `nearest_k` results found
+
+        Parameters
+        ----------
+        queries : ndarray
+            Query objects, one per row
+        k : int
+            Number of objects to return per query
+        n_probe : int, optional
+            Number of nearest cells to scan
+
+        Returns
+        -------
+        float
+            Mean recall at `k` of `search` against the exact
+            `nearest_k_batch` over the indexed objects
+        """
+
+        if issparse(queries):
+            queries = queries.toarray()
+        exact = self.ids[nearest_k_batch(queries, self.vectors, k,
+                                         self.metric, self.chunk_size)]
+        approx = self.search(queries, k, n_probe)
+        return np.mean([len(np.intersect1d(e, a)) / len(e)
+                        for e, a in zip(exact, approx)])
+
+    def save(self, path):
+        """Save the index to the directory `path` as `.npy` files"""
+        os.makedirs(path, exist_ok=True)
+        arrays = {'centroids': self.centroids, 'ids': self.ids,
+                  'offsets': self.offsets}
+        if issparse(self.vectors):
+            arrays.update(data=self.vectors.data,
+                          indices=self.vectors.indices,
+                          indptr=self.vectors.indptr)
+        else:
+            arrays['vectors'] = self.vectors
+        for name, arr in arrays.items():
+            np.save(os.path.join(path, f'{name}.npy'), arr)
+        meta = {'n_lists': self.n_lists, 'n_iter': self.n_iter,
+                'sample_size': self.sample_size,
+                'chunk_size': self.chunk_size, 'seed': self.seed,
+                'metric': self.metric.__name__,
+                'sparse': issparse(self.vectors),
+                'shape': list(self.vectors.shape)}
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load an index saved with `save`
+
+        The stored vectors are memory-mapped by default, so only the probed
+        cells are read from disk during a search.
+        """
+
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        index = cls(meta['n_lists'], cls.metrics[meta['metric']],
+                    meta['n_iter'], meta['sample_size'], meta['chunk_size'],
+                    meta['seed'])
+
+        def read(name):
+            return np.load(os.path.join(path, f'{name}.npy'),
+                           mmap_mode=mmap_mode)
+
+        index.centroids = np.asarray(read('centroids'))
+        index.ids = np.asarray(read('ids'))
+        index.offsets = np.asarray(read('offsets'))
+        if meta['sparse']:
+            index.vectors = csr_matrix(
+                (read('data'), read('indices'), read('indptr')),
+                shape=tuple(meta['shape']))
+        else:
+            index.vectors = read('vectors')
+        return index
+
+class InvertedIndex:
+    """Top-k cosine search over tf-idf postings lists
+
+    Each word of the vocabulary of a fitted `Vectorizer` has a postings list
+    of the documents containing it and their L2-normalized tf-idf weight,
+    stored as compact arrays. A query only reads the postings of its own
+    words, so its cost grows with the number of matching documents instead
+    of with the corpus or vocabulary size.
+
+    Parameters
+    ----------
+    vectorizer : Vectorizer
+        Vectorizer whose mappings were built with `build_mappings`
+    idf : array-like or pandas Series, optional
+        Inverse document frequency of each column of `vectorizer`, such as
+        `TFIDF.idf`; a Series indexed by word is aligned to the columns.
+        Computed from the fitted documents if not given.
+    """
+
+    def __init__(self, vectorizer, idf=None):
+        self.vectorizer = vectorizer
+        words = sorted(vectorizer.word_column,
+                       key=vectorizer.word_column.get)
+        if isinstance(idf, pd.Series):
+            idf = idf.rename(str.lower)
+            idf = idf[~idf.index.duplicated()].reindex(words, fill_value=0)
+        self.idf = None if idf is None else np.array(idf, dtype=np.float32)
+
+    def fit(self, docs):
+        """Build the postings lists of docs
+
+        Parameters
+        ----------
+        docs : iterable of str
+            Documents to index; their position is their document id
+
+        Returns
+        -------
+        self : InvertedIndex
+        """
+
+        X = self.vectorizer.vectorize_many(docs)
+        n_docs = X.shape[0]
+        if self.idf is None:
+            count = np.bincount(X.indices, minlength=X.shape[1])
+            with np.errstate(divide='ignore'):
+                self.idf = np.log(n_docs / count).astype(np.float32)
+        self.idf[~np.isfinite(self.idf)] = 0
+        X.data *= self.idf[X.indices]
+        norms = np.sqrt(_row_sq_norms(X))
+        norms[norms == 0] = 1
+        X.data /= np.repeat(norms, np.diff(X.indptr))
+        X = X.tocsc()
+        X.sort_indices()
+        self.n_docs = n_docs
+        self.indptr = X.indptr.astype(np.int64)
+        self.doc_ids = X.indices.astype(np.int32)
+        self.weights = X.data.astype(np.float32)
+        self.max_weight = np.zeros(X.shape[1], dtype=np.float32)
+        filled = np.flatnonzero(np.diff(self.indptr) > 0)
+        if len(filled):
+            self.max_weight[filled] = np.maximum.reduceat(
+                self.weights, self.indptr[filled])
+        return self
+
+    def _postings(self, term):
+        """Return the document ids and weights of term"""
+        start, stop = self.indptr[term], self.indptr[term + 1]
+        return self.doc_ids[start:stop], self.weights[start:stop]
+
+    def search(self, query, k, early_termination=True):
+        """Return the `k` documents with the highest cosine similarity
+
+        Query words are scored in decreasing order of their best possible
+        contribution. With `early_termination`, once the words left cannot
+        lift an unseen document into the top `k` (max-score), they only
+        update the scores of documents already found.
+
+        Parameters
+        ----------
+        query : str
+            Text to search for
+        k : int
+            Number of documents to return
+        early_termination : bool, optional
+            Skip documents that cannot reach the top `k`
+
+        Returns
+        -------
+        doc_ids : ndarray
+            Ids of the most similar documents, most similar first; fewer
+            than `k` if fewer documents share a word with the query
+        scores : ndarray
+            Cosine similarity of each returned document to the query
+        """
+
+        word_column = self.vectorizer.word_column
+        freq = {word_column[word]: count for word, count
+                in Counter(query.lower().split()).items()
+                if word in word_column}
+        terms = np.fromiter(freq, dtype=np.int64, count=len(freq))
+        q = np.fromiter(freq.values(), dtype=float, count=len(freq))
+        q *= self.idf[terms]
+        q_norm = np.linalg.norm(q)
+        if q_norm == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        q /= q_norm
+        bound = q * self.max_weight[terms]
+        order = np.argsort(-bound, kind='stable')
+        terms, q = terms[order], q[order]
+        rest = np.append(np.cumsum(bound[order][::-1])[::-1], 0)
+
+        cand = np.empty(0, dtype=np.int32)
+        scores = np.empty(0)
+        i = 0
+        while i < len(terms):
+            docs, w = self._postings(terms[i])
+            cand, inverse = np.unique(np.concatenate([cand, docs]),
+                                      return_inverse=True)
+            scores = np.bincount(inverse, minlength=len(cand),
+                                 weights=np.concatenate([scores, q[i] * w]))
+            i += 1
+            if (early_termination and len(cand) >= k
+                    and rest[i] <= np.partition(scores, -k)[-k]):
+                break
+        for j in range(i, len(terms)):
+            docs, w = self._postings(terms[j])
+            if len(docs) == 0:
+                continue
+            pos = np.minimum(np.searchsorted(docs, cand), len(docs) - 1)
+            hit = docs[pos] == cand
+            scores[hit] += q[j] * w[pos[hit]]
+
+        k = min(k, len(cand))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return cand[top], scores[top]
@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from scipy.sparse import csr_matrix, issparse
 from sklearn.datasets import load_wine, fetch_20newsgroups
 from sklearn.feature_extraction.text import CountVectorizer
 
@@ -22,6 +23,30 @@ def get_confusion(actual, results, all_labels):
                         columns=['relevant', 'irrelevant'],
                         index=['relevant', 'irrelevant'])
 
+def get_confusions(actual, results, all_labels):
+    """
+    The function accepts the labels of the correct classes, the results of
+    many queries as a (queries x k) matrix of indices to the objects and all
+    labels, and returns the confusion matrix entries of every query as a
+    pandas DataFrame with columns TP, FP, FN and TN, one row per query.
+    A single `actual` label is used for every query.
+    """
+
+    all_labels = np.asarray(all_labels)
+    results = np.atleast_2d(results)
+    actual = np.broadcast_to(np.asarray(actual), (len(results),))
+    TP = (all_labels[results] == actual[:, np.newaxis]).sum(axis=1)
+    FP = results.shape[1] - TP
+    labels, codes = np.unique(all_labels, return_inverse=True)
+    class_size = np.bincount(codes, minlength=len(labels))
+    pos = np.minimum(np.searchsorted(labels, actual), len(labels) - 1)
+    relevant = np.where(labels[pos] == actual, class_size[pos], 0)
+    FN = relevant - TP
+    TN = len(all_labels) - TP - FP - FN
+    return pd.DataFrame({'TP': TP, 'FP': FP, 'FN': FN, 'TN': TN})
+
+from scipy.spatial.distance import euclidean, cosine
+
 def nearest_k(query, objects, k, dist):
     """Return the indices to objects most similar to query
     
@@ -43,24 +68,101 @@ def nearest_k(query, objects, k, dist):
     most_similar : ndarray
         Indices to the most similar objects in the database
     """
-    return np.argsort([dist(query, obj) for obj in objects])[:k]
+    return nearest_k_batch(query, objects, k, dist)[0]
+
+def _block_dist(queries, objects, dist):
+    """Return the distance of every query to every object as a matrix
+
+    `euclidean` and `cosine` are computed with matrix products; any other
+    `dist` is called once per pair.
+    """
+
+    if dist is euclidean:
+        sq = ((queries**2).sum(axis=1)[:, np.newaxis]
+              + (objects**2).sum(axis=1)[np.newaxis, :]
+              - 2 * np.dot(queries, objects.T))
+        return np.sqrt(np.maximum(sq, 0))
+    elif dist is cosine:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 1 - (np.dot(queries, objects.T)
+                        / np.linalg.norm(queries, axis=1)[:, np.newaxis]
+                        / np.linalg.norm(objects, axis=1)[np.newaxis, :])
+    else:
+        return np.array([[dist(query, obj) for obj in objects]
+                         for query in queries], dtype=float)
+
+def nearest_k_batch(queries, objects, k, dist, chunk_size=10000):
+    """Return the indices to objects most similar to each query
+
+    The objects are scanned `chunk_size` rows at a time and only the best `k`
+    candidates of each query are kept between chunks, so memory stays at
+    about ``len(queries) * (chunk_size + k)`` distances.
+
+    Parameters
+    ----------
+    queries : ndarray
+        query objects, one per row, in the same vector representation as the
+        objects; a single 1-D query is also accepted
+    objects : ndarray
+        vector-represented objects in the database; rows correspond to
+        objects, columns correspond to features
+    k : int
+        number of most similar objects to return per query
+    dist : function
+        accepts two ndarrays as parameters then returns their distance
+    chunk_size : int, optional
+        number of objects to compare against the queries at a time
+
+    Returns
+    -------
+    most_similar : ndarray
+        Indices to the most similar objects in the database; row `i` holds
+        the results of query `i`, closest first
+    """
+
+    queries = np.atleast_2d(np.asarray(queries, dtype=float))
+    n_objects = objects.shape[0]
+    k = min(k, n_objects)
+    best_dist = np.empty((len(queries), 0))
+    best_idx = np.empty((len(queries), 0), dtype=int)
+    for start in range(0, n_objects, chunk_size):
+        block = _block_dist(queries, objects[start:start + chunk_size], dist)
+        idx = np.arange(start, start + block.shape[1])
+        best_dist = np.hstack([best_dist, block])
+        best_idx = np.hstack([best_idx, np.broadcast_to(idx, block.shape)])
+        if best_dist.shape[1] > k:
+            top = np.argpartition(best_dist, k - 1, axis=1)[:, :k]
+            best_dist = np.take_along_axis(best_dist, top, axis=1)
+            best_idx = np.take_along_axis(best_idx, top, axis=1)
+    order = np.argsort(best_dist, axis=1, kind='stable')
+    return np.take_along_axis(best_idx, order, axis=1)
 
 def precision(confusion):
     """
     The function accepts a confusion matrix and returns the precision.
+    Given the output of `get_confusions`, the precision of every query is
+    returned as a pandas Series.
     """
 
-    TP = confusion.loc['relevant', 'relevant']
-    FP = confusion.loc['relevant', 'irrelevant']
+    if 'TP' in confusion:
+        TP, FP = confusion['TP'], confusion['FP']
+    else:
+        TP = confusion.loc['relevant', 'relevant']
+        FP = confusion.loc['relevant', 'irrelevant']
     return TP / (TP + FP)
 
 def recall(confusion):
     """
     The function accepts a confusion matrix and returns the call.
+    Given the output of `get_confusions`, the recall of every query is
+    returned as a pandas Series.
     """
 
-    TP = confusion.loc['relevant', 'relevant']
-    FN = confusion.loc['irrelevant', 'relevant']
+    if 'TP' in confusion:
+        TP, FN = confusion['TP'], confusion['FN']
+    else:
+        TP = confusion.loc['relevant', 'relevant']
+        FN = confusion.loc['irrelevant', 'relevant']
     return TP / (TP + FN)
 
 def f_measure(precision, recall, beta=1):
@@ -73,15 +175,37 @@ def f_measure(precision, recall, beta=1):
     right = (precision * recall) / ((beta**2 * precision) + recall)
     return left * right
 
-def pr_curve(query, objects, dist, actual, all_labels):
+def pr_values(results, actual, all_labels):
+    """
+    The function accepts the ranking of the objects for a query (or a matrix
+    of rankings, one row per query), the label of the correct class of each
+    query and all labels, and returns the recalls and precisions at every
+    rank, starting from the point (0, 1).
+    """
+
     all_labels = np.asarray(all_labels)
-    results = nearest_k(query, objects, len(all_labels), dist)
-    rs = (all_labels[results] == actual).cumsum()
-    N = (all_labels == actual).sum()
-    precisions = rs / np.arange(1, len(rs)+1)
-    recalls = rs / N
-    recalls = [0] + recalls.tolist()
-    precisions = [1] + precisions.tolist()
+    single = np.ndim(results) == 1
+    results = np.atleast_2d(results)
+    actual = np.broadcast_to(np.asarray(actual), (len(results),))
+    rs = (all_labels[results] == actual[:, np.newaxis]).cumsum(axis=1)
+    N = (all_labels == actual[:, np.newaxis]).sum(axis=1)
+    precisions = rs / np.arange(1, rs.shape[1]+1)
+    recalls = rs / N[:, np.newaxis]
+    recalls = np.hstack([np.zeros((len(rs), 1)), recalls])
+    precisions = np.hstack([np.ones((len(rs), 1)), precisions])
+    if single:
+        return recalls[0], precisions[0]
+    return recalls, precisions
+
+def trapezoid(y, x):
+    """Integrate y over x with the trapezoidal rule along the last axis"""
+    return np.sum((x[..., 1:] - x[..., :-1]) * (y[..., 1:] + y[..., :-1]) / 2,
+                  axis=-1)
+
+def pr_curve(query, objects, dist, actual, all_labels, results=None):
+    if results is None:
+        results = nearest_k(query, objects, len(all_labels), dist)
+    recalls, precisions = pr_values(results, actual, all_labels)
 
     fig, ax = plt.subplots()
     ax.set_aspect('equal')
@@ -93,23 +217,191 @@ def pr_curve(query, objects, dist, actual, all_labels):
     ax.set_ylabel('precision');
     return ax
 
-def auc_pr(query, objects, dist, actual, all_labels):
-    from scipy.integrate import trapz
-    all_labels = np.asarray(all_labels)
-    results = nearest_k(query, objects, len(all_labels), dist)
-    rs = (all_labels[results] == actual).cumsum()
-    N = (all_labels == actual).sum()
-    precisions = rs / np.arange(1, len(rs)+1)
-    recalls = rs / N
-    recalls = [0] + recalls.tolist()
-    precisions = [1] + precisions.tolist()
-    return trapz(precisions, recalls)
+def auc_pr(query, objects, dist, actual, all_labels, results=None):
+    if results is None:
+        results = nearest_k(query, objects, len(all_labels), dist)
+    recalls, precisions = pr_values(results, actual, all_labels)
+    return trapezoid(precisions, recalls)
+
+def _score_queries(query_indices, objects, all_labels, dist, chunk_size,
+                   return_rankings=False):
+    """Rank all objects for each query object and score the rankings
+
+    The rankings themselves are only returned if `return_rankings`, since
+    they hold one integer per object for each query.
+    """
+    rankings = nearest_k_batch(objects[query_indices], objects,
+                               len(all_labels), dist, chunk_size)
+    recalls, precisions = pr_values(rankings, all_labels[query_indices],
+                                    all_labels)
+    auc = trapezoid(precisions, recalls)
+    ap = np.sum(np.diff(recalls, axis=1) * precisions[:, 1:], axis=1)
+    return (rankings if return_rankings else None), auc, ap
+
+_worker_args = ()
+
+def _init_worker(*args):
+    """Keep the objects and labels in each worker process"""
+    global _worker_args
+    _worker_args = args
+
+def _score_queries_worker(query_indices, return_rankings):
+    """Score queries with the arguments given to `_init_worker`"""
+    return _score_queries(query_indices, *_worker_args, return_rankings)
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+class RetrievalEvaluator:
+    def __init__(self, objects, all_labels, dist, chunk_size=10000,
+                 cache=True):
+        """Store the objects, labels and distance used to rank them
+
+        Every object can be used as a query. The ranking of a query
+        plotted with `pr_curve` or scored with `auc_pr` is kept if `cache`
+        is True; `evaluate` only keeps the rankings it computes if asked
+        to, since a full ranking is one integer per object for each query.
+        """
+
+        self.objects = np.asarray(objects)
+        self.all_labels = np.asarray(all_labels)
+        self.dist = dist
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.rankings = {}
+
+    def ranking(self, i):
+        """Return the ranking of all objects for object i as the query"""
+        if i in self.rankings:
+            return self.rankings[i]
+        results = nearest_k(self.objects[i], self.objects,
+                            len(self.all_labels), self.dist)
+        if self.cache:
+            self.rankings[i] = results
+        return results
+
+    def pr_curve(self, i):
+        """Plot the precision-recall curve of object i as the query"""
+        return pr_curve(self.objects[i], self.objects, self.dist,
+                        self.all_labels[i], self.all_labels,
+                        results=self.ranking(i))
+
+    def auc_pr(self, i):
+        """Return the AUC-PR of object i as the query"""
+        return auc_pr(self.objects[i], self.objects, self.dist,
+                      self.all_labels[i], self.all_labels,
+                      results=self.ranking(i))
+
+    def evaluate(self, query_indices=None, batch_size=100, n_jobs=1,
+                 verbose=True, cache_rankings=False):
+        """Score many objects as queries
+
+        The queries are ranked `batch_size` at a time, on `n_jobs` worker
+        processes if more than one, and the progress and throughput are
+        printed after each batch if `verbose`. The rankings are only sent
+        back from the workers and kept if `cache_rankings` and `cache`.
+
+        Returns a pandas DataFrame indexed by query with the AUC-PR and
+        average precision of each query, and sets `mean_average_precision`.
+        """
+
+        if query_indices is None:
+            query_indices = np.arange(len(self.objects))
+        query_indices = np.asarray(query_indices)
+        batches = [query_indices[i:i+batch_size]
+                   for i in range(0, len(query_indices), batch_size)]
+        args = (self.objects, self.all_labels, self.dist, self.chunk_size)
+        keep = cache_rankings and self.cache
+        auc = np.empty(len(query_indices))
+        ap = np.empty(len(query_indices))
+        start = time.perf_counter()
+        pool = (ProcessPoolExecutor(n_jobs, initializer=_init_worker,
+                                    initargs=args)
+                if n_jobs > 1 else None)
+        try:
+            if pool is None:
+                scored = (_score_queries(batch, *args, keep)
+                          for batch in batches)
+            else:
+                scored = pool.map(_score_queries_worker, batches,
+                                  [keep] * len(batches))
+            done = 0
+            for batch, (rankings, batch_auc, batch_ap) in zip(batches,
+                                                              scored):
+                if keep:
+                    self.rankings.update(zip(batch.tolist(), rankings))
+                auc[done:done+len(batch)] = batch_auc
+                ap[done:done+len(batch)] = batch_ap
+                done += len(batch)
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print(f'{done}/{len(query_indices)} queries in '
+                          f'{elapsed:.1f}s ({done / elapsed:.1f} queries/s)')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        scores = pd.DataFrame({'auc_pr': auc, 'average_precision': ap},
+                              index=query_indices)
+        self.mean_average_precision = scores['average_precision'].mean()
+        return scores
 
 class Standardizer:
-    def __init__(self, df):
-        """Store the mean and standard deviation of each column"""
-        self.mean = df.mean()
-        self.std = df.std()
+    def __init__(self, df=None):
+        """Store the mean and standard deviation of each column
+
+        Without `df`, the statistics are built chunk by chunk with
+        `partial_fit` or combined from other fitted instances with `merge`.
+        """
+
+        self.n = self.mean = self.M2 = self.std = None
+        if df is not None:
+            self.n = df.count()
+            self.mean = df.mean()
+            self.M2 = df.var(ddof=0) * self.n
+            self.std = df.std()
+
+    def partial_fit(self, chunk):
+        """Update the mean and standard deviation with a chunk of rows"""
+        chunk = pd.DataFrame(chunk)
+        n = chunk.count()
+        return self._combine(n, chunk.mean(), chunk.var(ddof=0) * n)
+
+    def merge(self, other):
+        """Add the statistics of a Standardizer fitted on other rows"""
+        return self._combine(other.n, other.mean, other.M2)
+
+    def _combine(self, n_b, mean_b, M2_b):
+        """Merge counts, means and sums of squared deviations (Chan et al.)"""
+        if self.n is None:
+            self.n, self.mean, self.M2 = n_b, mean_b, M2_b
+        else:
+            # Align to the union of columns so that a column first seen in
+            # a later chunk starts from zero rows instead of NaN
+            columns = self.n.index.union(n_b.index, sort=False)
+            n_a = self.n.reindex(columns, fill_value=0)
+            n_b = n_b.reindex(columns, fill_value=0)
+            mean_a = self.mean.reindex(columns)
+            mean_b = mean_b.reindex(columns)
+            M2_a = self.M2.reindex(columns).fillna(0)
+            M2_b = M2_b.reindex(columns).fillna(0)
+            n = n_a + n_b
+            delta = (mean_b - mean_a).fillna(0)
+            self.mean = (mean_a.where(n_a > 0, mean_b)
+                         + delta * (n_b / n).fillna(0))
+            self.M2 = M2_a + M2_b + delta**2 * (n_a * n_b / n).fillna(0)
+            self.n = n
+        self.std = np.sqrt(self.M2 / (self.n - 1)).where(self.n > 1)
+        return self
+
+    def save(self, path):
+        """Save the fitted statistics to path"""
+        pd.to_pickle(self.__dict__, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load statistics saved with `save`"""
+        obj = cls()
+        obj.__dict__.update(pd.read_pickle(path))
+        return obj
 
     def standardize(self, values):
         """Standardize values per column"""
@@ -130,42 +422,225 @@ ax.text(0.65, 0.8,
          fontsize=12);
 
 class MinMax:
-    def __init__(self, df):
-        """Store the minimum and maximum values of each column"""
-        self.min = df.min()
-        self.max = df.max()
+    def __init__(self, df=None):
+        """Store the minimum and maximum values of each column
+
+        Without `df`, the statistics are built chunk by chunk with
+        `partial_fit` or combined from other fitted instances with `merge`.
+        """
+
+        self.min = self.max = None
+        if df is not None:
+            self.min = df.min()
+            self.max = df.max()
+
+    def partial_fit(self, chunk):
+        """Update the minimum and maximum with a chunk of rows"""
+        chunk = pd.DataFrame(chunk)
+        return self._combine(chunk.min(), chunk.max())
+
+    def merge(self, other):
+        """Add the statistics of a MinMax fitted on other rows"""
+        return self._combine(other.min, other.max)
+
+    def _combine(self, min_b, max_b):
+        """Keep the smaller minimum and larger maximum of each column"""
+        if self.min is None:
+            self.min, self.max = min_b, max_b
+        else:
+            self.min = pd.concat([self.min, min_b], axis=1).min(axis=1)
+            self.max = pd.concat([self.max, max_b], axis=1).max(axis=1)
+        return self
+
+    def save(self, path):
+        """Save the fitted statistics to path"""
+        pd.to_pickle(self.__dict__, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load statistics saved with `save`"""
+        obj = cls()
+        obj.__dict__.update(pd.read_pickle(path))
+        return obj
 
     def minmax(self, values):
         """Standard values per column"""
         return (values - self.min) / (self.max - self.min)
 
 class TFIDF:
-    def __init__(self, df):
-        """Store the idf of each column"""
-        n_docs = df.shape[0]
-        count = df[df > 0].count()
-        self.idf = np.log(n_docs / count)
+    def __init__(self, df=None):
+        """Store the idf of each column
 
-    def tfidf(self, values):
-        """Standard values per column"""
-        return self.idf * values
+        Without `df`, the document frequencies are counted chunk by chunk
+        with `partial_fit` or combined from other fitted instances with
+        `merge`.
+
+        `df` and the chunks may also be `scipy.sparse` document-term
+        matrices. The document frequencies are then counted from the
+        column indices of the stored entries and the idf is kept as a
+        float32 ndarray.
+        """
+
+        self.n_docs = 0
+        self.count = self.idf = None
+        if df is not None:
+            self.partial_fit(df)
+
+    def _doc_freq(self, chunk):
+        """Return the number of documents of chunk containing each column"""
+        if issparse(chunk):
+            chunk = csr_matrix(chunk)
+            return np.bincount(chunk.indices[chunk.data > 0],
+                               minlength=chunk.shape[1])
+        return (pd.DataFrame(chunk) > 0).sum()
+
+    def partial_fit(self, chunk):
+        """Update the document frequencies with a chunk of documents"""
+        return self._combine(chunk.shape[0], self._doc_freq(chunk))
+
+    def merge(self, other):
+        """Add the document frequencies of a TFIDF fitted on other rows"""
+        return self._combine(other.n_docs, other.count)
+
+    def _combine(self, n_docs, count):
+        """Add document counts and recompute the idf"""
+        self.n_docs += n_docs
+        if self.count is None:
+            self.count = count
+        elif isinstance(self.count, pd.Series):
+            self.count = self.count.add(count, fill_value=0)
+        else:
+            self.count = self.count + count
+        if isinstance(self.count, pd.Series):
+            self.idf = np.log(self.n_docs / self.count)
+        else:
+            with np.errstate(divide='ignore'):
+                self.idf = np.ascontiguousarray(
+                    np.log(self.n_docs / self.count), dtype=np.float32)
+        return self
+
+    def save(self, path):
+        """Save the fitted statistics to path"""
+        pd.to_pickle(self.__dict__, path)
 
-def normalize1(values):
+    @classmethod
+    def load(cls, path):
+        """Load statistics saved with `save`"""
+        obj = cls()
+        obj.__dict__.update(pd.read_pickle(path))
+        return obj
+
+    def tfidf(self, values, norm=None, copy=True):
+        """Standard values per column
+
+        A `scipy.sparse` matrix is weighted directly in its data buffer,
+        in place if `copy` is False and it is already a float CSR matrix,
+        and returned as CSR. With `norm='l2'` each row is also scaled to
+        unit length.
+        """
+
+        if not issparse(values):
+            result = self.idf * values
+            return normalize2(result) if norm == 'l2' else result
+        X = csr_matrix(values, copy=copy,
+                       dtype=np.result_type(values.dtype, np.float32))
+        X.data *= np.asarray(self.idf, dtype=X.dtype)[X.indices]
+        if norm == 'l2':
+            normalize2(X, inplace=True)
+        return X
+
+def _normalize(values, order, out, inplace, block_size):
+    """Divide each row of values by its L1 (order=1) or L2 (order=2) norm"""
+    def norms(block):
+        if order == 1:
+            return np.abs(block).sum(axis=-1)
+        return np.sqrt(np.einsum('...i,...i->...', block, block))
+
+    if isinstance(values, (pd.DataFrame, pd.Series)):
+        if out is not None:
+            raise ValueError('out is not supported for pandas input')
+        if inplace and not all(np.issubdtype(dtype, np.floating) for dtype
+                               in np.atleast_1d(values.dtypes)):
+            raise ValueError('inplace needs float columns')
+        result = _normalize(np.array(values, dtype=float), order, None, True,
+                            block_size)
+        if inplace:
+            values.iloc[:] = result
+            return values
+        if isinstance(values, pd.Series):
+            return pd.Series(result, index=values.index, name=values.name)
+        return pd.DataFrame(result, index=values.index,
+                            columns=values.columns)
+    if issparse(values):
+        if inplace:
+            if (values.format != 'csr'
+                    or not np.issubdtype(values.dtype, np.floating)):
+                raise ValueError('inplace needs a float CSR matrix')
+            X = values
+        else:
+            X = csr_matrix(values, copy=True,
+                           dtype=np.result_type(values.dtype, np.float32))
+        for start in range(0, X.shape[0], block_size):
+            stop = min(start + block_size, X.shape[0])
+            lo, hi = X.indptr[start], X.indptr[stop]
+            data = X.data[lo:hi]
+            nnz = np.diff(X.indptr[start:stop+1])
+            filled = nnz > 0
+            row_norms = np.zeros(stop - start, dtype=X.dtype)
+            if filled.any():
+                row_norms[filled] = np.add.reduceat(
+                    np.abs(data) if order == 1 else data**2,
+                    X.indptr[start:stop][filled] - lo)
+                if order == 2:
+                    np.sqrt(row_norms, out=row_norms)
+            row_norms[row_norms == 0] = 1
+            data /= np.repeat(row_norms, nnz)
+        return X
+
+    values = np.asarray(values)
+    if inplace:
+        out = values
+    elif out is None:
+        out = np.empty(values.shape, dtype=np.result_type(values, float))
+    if values.ndim == 1:
+        norm = norms(values)
+        return np.divide(values, norm if norm else 1, out=out)
+    for start in range(0, len(values), block_size):
+        block = values[start:start+block_size]
+        row_norms = norms(block)
+        row_norms[row_norms == 0] = 1
+        np.divide(block, row_norms[:, np.newaxis],
+                  out=out[start:start+block_size])
+    return out
+
+def normalize1(values, out=None, inplace=False, block_size=65536):
     """
     The function accepts values and normalizes by their L1-norm.
+
+    DataFrames, 2-D arrays and `scipy.sparse` matrices are normalized per
+    row and a Series or 1-D array as a single vector; rows with zero norm
+    are left as zeros. Arrays are processed `block_size` rows at a time
+    and written to `out`, or over `values` itself if `inplace`, so only
+    one block of temporaries is allocated. Sparse matrices are normalized
+    through their CSR data buffer, in place if `inplace`. With pandas
+    input, `inplace` writes the result back into its (float) columns and
+    `out` raises a ValueError.
     """
 
-    try:
-        return values.divide(values.sum(axis=1), axis=0)
-    except:
-        return np.divide(values, values.sum())
+    return _normalize(values, 1, out, inplace, block_size)
 
-def normalize2(values):
+def normalize2(values, out=None, inplace=False, block_size=65536):
     """
     The function accepts values and normalizes by their L2-norm.
+
+    DataFrames, 2-D arrays and `scipy.sparse` matrices are normalized per
+    row and a Series or 1-D array as a single vector; rows with zero norm
+    are left as zeros. Arrays are processed `block_size` rows at a time
+    and written to `out`, or over `values` itself if `inplace`, so only
+    one block of temporaries is allocated. Sparse matrices are normalized
+    through their CSR data buffer, in place if `inplace`. With pandas
+    input, `inplace` writes the result back into its (float) columns and
+    `out` raises a ValueError.
     """
 
-    try:
-        return values.divide(np.sqrt((values**2).sum(axis=1)), axis=0)
-    except:
-        return np.divide(values, np.sqrt((values**2).sum()))
+    return _normalize(values, 2, out, inplace, block_size)
@@ -4,33 +4,348 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.datasets import load_boston
 
+from matplotlib.colors import LogNorm
+def density_scatter(ax, x, y, c=None, cmap=None, max_points=50000, bins=300,
+                    **kwargs):
+    """
+    Scatter plot x and y on ax, or draw their density if there are more
+    than `max_points` points
 
-from sklearn.decomposition import NMF
+    The points are binned into a `bins` x `bins` grid with NumPy, so drawing
+    does not depend on the number of points. Without `c` the raster shows
+    the log count of each bin. With labels `c`, each bin takes the colour
+    of its most frequent label with opacity growing with its log count.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= max_points:
+        return ax.scatter(x, y, c=c, cmap=cmap, **kwargs)
 
-nmf = NMF()
-U = nmf.fit_transform(X)
-V = nmf.components_.T
+    extent = [x.min(), x.max(), y.min(), y.max()]
+    xi = np.clip(((x - extent[0]) / ((extent[1] - extent[0]) or 1)
+                  * bins).astype(int), 0, bins - 1)
+    yi = np.clip(((y - extent[2]) / ((extent[3] - extent[2]) or 1)
+                  * bins).astype(int), 0, bins - 1)
+    cell = yi * bins + xi
+    counts = np.bincount(cell, minlength=bins * bins)
+    image_kw = dict(origin='lower', extent=extent, aspect=ax.get_aspect(),
+                    interpolation='nearest')
+    if c is None:
+        image = np.ma.masked_equal(counts.reshape(bins, bins), 0)
+        return ax.imshow(image, cmap=cmap or 'viridis', norm=LogNorm(),
+                         **image_kw)
 
-from sklearn.decomposition import PCA
-
-pca = PCA(2)
-plt.scatter(*pca.fit_transform(X).T, c=U.argmax(axis=1), cmap='Set1')
-plt.xlabel('PC1')
-plt.ylabel('PC2');
+    labels, codes = np.unique(np.asarray(c), return_inverse=True)
+    per_label = np.bincount(cell * len(labels) + codes,
+                            minlength=bins * bins * len(labels))
+    dominant = per_label.reshape(bins * bins, len(labels)).argmax(axis=1)
+    colors = plt.get_cmap(cmap)(np.linspace(0, 1, len(labels)))
+    rgba = colors[dominant]
+    rgba[:, 3] = np.log1p(counts) / np.log1p(counts.max())
+    return ax.imshow(rgba.reshape(bins, bins, 4), **image_kw)
 
+import os
+import copy
+import pickle
+import hashlib
+from collections import OrderedDict
+from scipy.sparse import issparse
+from sklearn.decomposition import NMF, MiniBatchNMF, PCA, TruncatedSVD
 from sklearn.cluster import KMeans
+import time
+from scipy.sparse import csr_matrix
+class StreamingKMeans:
+    """Mini-batch k-means for very many rows, such as NMF topic loadings
 
-kmeans = KMeans()
-plt.scatter(*pca.fit_transform(X).T, c=kmeans.fit_predict(U), cmap='Set1')
-plt.xlabel('PC1')
-plt.ylabel('PC2');
+    Centroids are seeded with k-means++ on a random sample and then moved
+    towards the mean of the rows assigned to them in each batch, with a
+    step that shrinks as a centroid absorbs more rows. Assignment is done
+    `block_size` rows at a time with matrix products.
+
+    Parameters
+    ----------
+    n_clusters : int, optional
+        Number of clusters
+    batch_size : int, optional
+        Number of rows per `partial_fit` batch in `fit`
+    sample_size : int, optional
+        Number of rows the k-means++ seeding is run on
+    block_size : int, optional
+        Number of rows assigned to centroids at a time
+    random_state : int, optional
+        Seed of the sample, seeding and batch order
+    verbose : bool, optional
+        Print the inertia and throughput of each batch
+    """
+
+    def __init__(self, n_clusters=8, batch_size=1024, sample_size=10000,
+                 block_size=8192, random_state=0, verbose=False):
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.sample_size = sample_size
+        self.block_size = block_size
+        self.rng = np.random.default_rng(random_state)
+        self.verbose = verbose
+        self.cluster_centers_ = None
+        self.history = []
+
+    def _assign(self, X):
+        """Return the nearest centroid and squared distance of each row"""
+        centers = self.cluster_centers_
+        c_sq = (centers**2).sum(axis=1)
+        labels = np.empty(len(X), dtype=np.int64)
+        dist = np.empty(len(X))
+        for start in range(0, len(X), self.block_size):
+            block = np.asarray(X[start:start+self.block_size], dtype=float)
+            d2 = ((block**2).sum(axis=1)[:, np.newaxis] + c_sq
+                  - 2 * block @ centers.T)
+            labels[start:start+len(block)] = d2.argmin(axis=1)
+            dist[start:start+len(block)] = np.maximum(d2.min(axis=1), 0)
+        return labels, dist
+
+    def _seed(self, sample):
+        """Choose the initial centroids from sample with k-means++"""
+        sample = np.asarray(sample, dtype=float)
+        k = min(self.n_clusters, len(sample))
+        centers = [sample[self.rng.integers(len(sample))]]
+        d2 = ((sample - centers[0])**2).sum(axis=1)
+        for _ in range(1, k):
+            total = d2.sum()
+            i = (self.rng.choice(len(sample), p=d2 / total) if total > 0
+                 else self.rng.integers(len(sample)))
+            centers.append(sample[i])
+            d2 = np.minimum(d2, ((sample - sample[i])**2).sum(axis=1))
+        self.cluster_centers_ = np.array(centers)
+        self.counts = np.zeros(k)
+
+    def partial_fit(self, X):
+        """Update the centroids with a batch of rows
+
+        The batch inertia before the update and the rows per second are
+        appended to `history`.
+
+        Returns
+        -------
+        self : StreamingKMeans
+        """
+
+        start = time.perf_counter()
+        X = np.asarray(X, dtype=float)
+        if self.cluster_centers_ is None:
+            self._seed(X)
+        labels, dist = self._assign(X)
+        k = len(self.cluster_centers_)
+        members = csr_matrix((np.ones(len(X)), (labels, np.arange(len(X)))),
+                             shape=(k, len(X)))
+        batch_counts = np.bincount(labels, minlength=k)
+        filled = batch_counts > 0
+        self.counts += batch_counts
+        step = batch_counts[filled] / self.counts[filled]
+        means = (members @ X)[filled] / batch_counts[filled, np.newaxis]
+        self.cluster_centers_[filled] += (
+            step[:, np.newaxis] * (means - self.cluster_centers_[filled]))
+        elapsed = time.perf_counter() - start
+        self.history.append({'rows': len(X), 'inertia': dist.sum(),
+                             'rows_per_s': len(X) / elapsed})
+        if self.verbose:
+            print(f'batch {len(self.history)}: inertia/row '
+                  f'{dist.mean():.4g}, {len(X) / elapsed:.0f} rows/s')
+        return self
+
+    def fit(self, U, n_epochs=3):
+        """Seed on a sample of U, then run `n_epochs` passes of batches
+
+        Returns
+        -------
+        self : StreamingKMeans
+        """
+
+        n = len(U)
+        sample = np.sort(self.rng.choice(n, min(self.sample_size, n),
+                                         replace=False))
+        self._seed(U[sample])
+        for _ in range(n_epochs):
+            order = self.rng.permutation(n)
+            for start in range(0, n, self.batch_size):
+                batch = np.sort(order[start:start+self.batch_size])
+                self.partial_fit(U[batch])
+        return self
+
+    def predict(self, U):
+        """Return the index of the nearest centroid of each row of U"""
+        return self._assign(U)[0]
+
+    def fit_predict(self, U, n_epochs=3):
+        """Fit on U and return its cluster labels, setting `inertia_`"""
+        labels, dist = self.fit(U, n_epochs)._assign(U)
+        self.inertia_ = dist.sum()
+        return labels
+
+class TopicPipeline:
+    """NMF topics, 2-D projection and topic clusters of a design matrix
+
+    Each step is computed once per input matrix and parameters and cached
+    in memory and, if `cache_dir` is given, as pickles on disk, so
+    re-running the analysis on the same data does not refit anything.
+    Sparse input is supported; it is projected with `TruncatedSVD` since
+    `PCA` would have to center it.
+
+    Parameters
+    ----------
+    n_components : int, optional
+        Number of NMF topics; defaults to the number of features
+    n_clusters : int, optional
+        Number of KMeans clusters of the topic loadings `U`
+    mini_batch : bool, optional
+        Use `MiniBatchNMF` and `StreamingKMeans`, which can be updated with
+        `partial_fit`
+    batch_size : int, optional
+        Batch size of `MiniBatchNMF`
+    cache_dir : str, optional
+        Directory of the on-disk cache
+    memory_size : int, optional
+        Number of results kept in memory; the least recently used are
+        dropped beyond it and reloaded from `cache_dir` when needed
+    random_state : int, optional
+        Seed of NMF and KMeans
+    """
+
+    def __init__(self, n_components=None, n_clusters=8, mini_batch=False,
+                 batch_size=1024, cache_dir=None, memory_size=8,
+                 random_state=0):
+        self.n_components = n_components
+        self.n_clusters = n_clusters
+        self.mini_batch = mini_batch
+        self.batch_size = batch_size
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.random_state = random_state
+        self._memory = OrderedDict()
+
+    @staticmethod
+    def _hash(X):
+        """Return a digest of the contents of X"""
+        digest = hashlib.blake2b(digest_size=16)
+        if issparse(X):
+            arrays = [X.data, X.indices, X.indptr]
+            dtype = X.dtype
+        else:
+            arrays = [np.asarray(X)]
+            dtype = arrays[0].dtype
+        digest.update(repr((type(X).__name__, X.shape, str(dtype))).encode())
+        for arr in arrays:
+            digest.update(np.ascontiguousarray(arr).data)
+        return digest.hexdigest()
+
+    def _cached(self, key, compute):
+        """Return the cached value of key, computing and storing it if new"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        path = (os.path.join(self.cache_dir, f'{key}.pkl')
+                if self.cache_dir else None)
+        if path and os.path.exists(path):
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        else:
+            value = compute()
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(path, 'wb') as file:
+                    pickle.dump(value, file)
+        self._memory[key] = value
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+        return value
+
+    def _make_nmf(self):
+        """Return an unfitted NMF or MiniBatchNMF"""
+        if self.mini_batch:
+            return MiniBatchNMF(self.n_components,
+                                batch_size=self.batch_size,
+                                random_state=self.random_state)
+        return NMF(self.n_components, random_state=self.random_state)
+
+    def _fit_nmf(self, X):
+        """Return the fitted NMF model and topic loadings of X"""
+        nmf = self._make_nmf()
+        U = nmf.fit_transform(X)
+        return nmf, U
+
+    def _fit_projection(self, X):
+        """Return the fitted projector and 2-D projection of X"""
+        projector = TruncatedSVD(2) if issparse(X) else PCA(2)
+        return projector, projector.fit_transform(X)
+
+    def _fit_kmeans(self, U):
+        """Return the fitted KMeans model and cluster labels of U"""
+        if self.mini_batch:
+            kmeans = StreamingKMeans(self.n_clusters, self.batch_size,
+                                     random_state=self.random_state)
+        else:
+            kmeans = KMeans(self.n_clusters, random_state=self.random_state)
+        return kmeans, kmeans.fit_predict(U)
+
+    def fit(self, X):
+        """Compute or load the topics, projection and clusters of X
+
+        Returns
+        -------
+        self : TopicPipeline
+        """
+
+        x_key = self._hash(X)
+        nmf_key = (f'nmf-{x_key}-{self.n_components}-{self.mini_batch}-'
+                   f'{self.batch_size}-{self.random_state}')
+        self.nmf, self.U = self._cached(nmf_key, lambda: self._fit_nmf(X))
+        self.projector, self.projection = self._cached(
+            f'projection-{x_key}', lambda: self._fit_projection(X))
+        self.kmeans, self.labels = self._cached(
+            f'kmeans-{nmf_key}-{self.n_clusters}',
+            lambda: self._fit_kmeans(self.U))
+        return self
+
+    @property
+    def V(self):
+        """Topic-feature matrix, one column per topic"""
+        return self.nmf.components_.T
+
+    def partial_fit(self, X_new):
+        """Update the topics with new rows and append their results
+
+        With `mini_batch`, the fitted `MiniBatchNMF` and `StreamingKMeans`
+        are warm-started on `X_new` only; its loadings, projection and
+        cluster labels are appended to `U`, `projection` and `labels`.
+
+        Returns
+        -------
+        self : TopicPipeline
+        """
+
+        if not self.mini_batch:
+            raise ValueError('partial_fit needs mini_batch=True')
+        self.nmf = copy.deepcopy(self.nmf)
+        self.kmeans = copy.deepcopy(self.kmeans)
+        self.nmf.partial_fit(X_new)
+        U_new = self.nmf.transform(X_new)
+        self.kmeans.partial_fit(U_new)
+        self.U = np.vstack([self.U, U_new])
+        self.projection = np.vstack([self.projection,
+                                     self.projector.transform(X_new)])
+        self.labels = np.concatenate([self.labels,
+                                      self.kmeans.predict(U_new)])
+        return self
+
+pipeline = TopicPipeline().fit(X)
+U = pipeline.U
+V = pipeline.V
 
-pca = PCA(2)
-plt.scatter(*pca.fit_transform(X).T, c=U.argmax(axis=1), cmap='Set1')
+density_scatter(plt.gca(), *pipeline.projection.T, c=U.argmax(axis=1),
+                cmap='Set1')
 plt.xlabel('PC1')
 plt.ylabel('PC2');
 
-kmeans = KMeans()
-plt.scatter(*pca.fit_transform(X).T, c=kmeans.fit_predict(U), cmap='Set1')
+density_scatter(plt.gca(), *pipeline.projection.T, c=pipeline.labels,
+                cmap='Set1')
 plt.xlabel('PC1')
 plt.ylabel('PC2');
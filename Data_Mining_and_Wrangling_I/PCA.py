@@ -5,17 +5,93 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.datasets import load_wine, fetch_20newsgroups, load_boston
 
-def pca(X):
+def _chunks(X, chunk_size):
+    """Yield the row blocks of X as float arrays"""
+    for start in range(0, X.shape[0], chunk_size):
+        yield start, np.asarray(X[start:start+chunk_size], dtype=float)
+
+def _mean_cov(X, chunk_size):
+    """Return the mean and biased covariance of X accumulated over chunks"""
+    n = 0
+    mean = np.zeros(X.shape[1])
+    scatter = np.zeros((X.shape[1], X.shape[1]))
+    for _, chunk in _chunks(X, chunk_size):
+        n_b = len(chunk)
+        mean_b = chunk.mean(axis=0)
+        centered = chunk - mean_b
+        delta = mean_b - mean
+        scatter += (centered.T @ centered
+                    + np.outer(delta, delta) * n * n_b / (n + n_b))
+        mean += delta * n_b / (n + n_b)
+        n += n_b
+    return mean, scatter / n
+
+def pca(X, n_components=None, method='exact', chunk_size=None,
+        n_oversamples=10, n_iter=4, seed=0):
     """
     The function accepts a design matrix and returns
     the rotated design matrix.
+
+    Only the first `n_components` principal components are returned if
+    given, at most the number of features (and of rows for 'randomized').
+    `method` is 'exact' for a symmetric eigendecomposition of the
+    covariance matrix, 'incremental' for the same decomposition with the
+    mean and covariance accumulated over `chunk_size` rows at a time, or
+    'randomized' for a randomized range finder with `n_iter` power
+    iterations that never forms the covariance matrix. `X` may also be the
+    path to a `.npy` file, which is memory-mapped and read in chunks.
+    The variance explained is relative to the total variance of `X`.
     """
-    A = X - X.mean(axis=0)
-    cov = np.cov(A, rowvar=False, bias=True)
-    e_val, e_vec = np.linalg.eig(cov)
-    order = e_val.argsort()[::-1]
-    e_val = e_val[order]
-    w = e_vec[:, order]
-    X_new = np.dot(A, w)
-    variance_explained = e_val/sum(e_val)
+    if isinstance(X, str):
+        X = np.load(X, mmap_mode='r')
+    if method not in ('exact', 'incremental', 'randomized'):
+        raise ValueError("method must be 'exact', 'incremental' or "
+                         "'randomized'")
+    n, d = X.shape
+    k = d if n_components is None else min(n_components, d)
+    if chunk_size is None:
+        chunk_size = n if method == 'exact' else 10000
+
+    if method == 'randomized':
+        k = min(k, n)
+        mean = np.zeros(d)
+        total = 0
+        for _, chunk in _chunks(X, chunk_size):
+            mean += chunk.sum(axis=0)
+        mean /= n
+        for _, chunk in _chunks(X, chunk_size):
+            total += ((chunk - mean)**2).sum()
+        total /= n
+
+        def times(M):
+            """Return (X - mean) @ M"""
+            return np.vstack([(chunk - mean) @ M
+                              for _, chunk in _chunks(X, chunk_size)])
+
+        def times_t(Q):
+            """Return (X - mean).T @ Q"""
+            return sum((chunk - mean).T @ Q[start:start+len(chunk)]
+                       for start, chunk in _chunks(X, chunk_size))
+
+        rng = np.random.default_rng(seed)
+        Q = times(rng.normal(size=(d, min(k + n_oversamples, n, d))))
+        Q, _ = np.linalg.qr(Q)
+        for _ in range(n_iter):
+            Q, _ = np.linalg.qr(times_t(Q))
+            Q, _ = np.linalg.qr(times(Q))
+        _, s, vt = np.linalg.svd(times_t(Q).T, full_matrices=False)
+        w = vt[:k].T
+        e_val = s[:k]**2 / n
+    else:
+        mean, cov = _mean_cov(X, chunk_size)
+        e_val, e_vec = np.linalg.eigh(cov)
+        total = e_val.sum()
+        order = e_val.argsort()[::-1][:k]
+        e_val = e_val[order]
+        w = e_vec[:, order]
+
+    X_new = np.empty((n, k))
+    for start, chunk in _chunks(X, chunk_size):
+        X_new[start:start+len(chunk)] = (chunk - mean) @ w
+    variance_explained = e_val/total
     return X_new, w, variance_explained
@@ -3,16 +3,87 @@ import matplotlib.pyplot as plt
 from sklearn.datasets import load_boston, fetch_20newsgroups
 from sklearn.feature_extraction.text import TfidfVectorizer
 
-def truncated_svd(X):
+from scipy.sparse import issparse
+from scipy.sparse.linalg import svds
+def truncated_svd(X, k=None, method='randomized', n_oversamples=10,
+                  n_iter=4, seed=0):
     """
     The functions returns q, sigma, p and the normalized sum of squared
     distance from the origin.
+
+    If `k` is given, only the top `k` singular triplets of `X`, which may be
+    a `scipy.sparse` matrix, are computed. `method` is 'randomized' for a
+    randomized range finder with `n_iter` power iterations or 'lanczos' for
+    `scipy.sparse.linalg.svds`. q and p then have `k` columns, sigma is a
+    vector of the `k` singular values and the normalized sum of squared
+    distance is relative to the squared Frobenius norm of `X`.
+    """
+    if k is None:
+        q, s, p = np.linalg.svd(X)
+        res = q, np.diag(s), p.T, (s / np.linalg.norm(s))**2
+        return res
+
+    if method == 'randomized':
+        rng = np.random.default_rng(seed)
+        n_cols = min(k + n_oversamples, min(X.shape))
+        Q, _ = np.linalg.qr(X @ rng.normal(size=(X.shape[1], n_cols)))
+        for _ in range(n_iter):
+            Q, _ = np.linalg.qr(X.T @ Q)
+            Q, _ = np.linalg.qr(X @ Q)
+        u, s, pt = np.linalg.svd(np.asarray((X.T @ Q).T),
+                                 full_matrices=False)
+        q = Q @ u[:, :k]
+        s, p = s[:k], pt[:k].T
+    elif method == 'lanczos':
+        q, s, pt = svds(X, k=k)
+        order = s.argsort()[::-1]
+        q, s, p = q[:, order], s[order], pt[order].T
+    else:
+        raise ValueError("method must be 'randomized' or 'lanczos'")
+    total = (X.multiply(X).sum() if issparse(X) else (X**2).sum())
+    return q, s, p, s**2 / total
+
+from matplotlib.colors import LogNorm
+def density_scatter(ax, x, y, c=None, cmap=None, max_points=50000, bins=300,
+                    **kwargs):
     """
-    q, s, p = np.linalg.svd(X)
-    res = q, np.diag(s), p.T, (s / np.linalg.norm(s))**2
-    return res
+    Scatter plot x and y on ax, or draw their density if there are more
+    than `max_points` points
 
-def plot_svd(X_new, features, p):
+    The points are binned into a `bins` x `bins` grid with NumPy, so drawing
+    does not depend on the number of points. Without `c` the raster shows
+    the log count of each bin. With labels `c`, each bin takes the colour
+    of its most frequent label with opacity growing with its log count.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= max_points:
+        return ax.scatter(x, y, c=c, cmap=cmap, **kwargs)
+
+    extent = [x.min(), x.max(), y.min(), y.max()]
+    xi = np.clip(((x - extent[0]) / ((extent[1] - extent[0]) or 1)
+                  * bins).astype(int), 0, bins - 1)
+    yi = np.clip(((y - extent[2]) / ((extent[3] - extent[2]) or 1)
+                  * bins).astype(int), 0, bins - 1)
+    cell = yi * bins + xi
+    counts = np.bincount(cell, minlength=bins * bins)
+    image_kw = dict(origin='lower', extent=extent, aspect=ax.get_aspect(),
+                    interpolation='nearest')
+    if c is None:
+        image = np.ma.masked_equal(counts.reshape(bins, bins), 0)
+        return ax.imshow(image, cmap=cmap or 'viridis', norm=LogNorm(),
+                         **image_kw)
+
+    labels, codes = np.unique(np.asarray(c), return_inverse=True)
+    per_label = np.bincount(cell * len(labels) + codes,
+                            minlength=bins * bins * len(labels))
+    dominant = per_label.reshape(bins * bins, len(labels)).argmax(axis=1)
+    colors = plt.get_cmap(cmap)(np.linspace(0, 1, len(labels)))
+    rgba = colors[dominant]
+    rgba[:, 3] = np.log1p(counts) / np.log1p(counts.max())
+    return ax.imshow(rgba.reshape(bins, bins, 4), **image_kw)
+
+def plot_svd(X_new, features, p, max_points=50000):
     """
     Plot transformed data and features on to the first two singular vectors
     
@@ -24,10 +95,13 @@ def plot_svd(X_new, features, p):
         Feature names
     p : array
         P matrix
+    max_points : int, optional
+        Draw the density of the data instead of every point above this
+        number of points
     """
     fig, ax = plt.subplots(1, 2, subplot_kw=dict(aspect='equal'), 
                            gridspec_kw=dict(wspace=0.4), dpi=150)
-    ax[0].scatter(X_new[:,0], X_new[:,1])
+    density_scatter(ax[0], X_new[:,0], X_new[:,1], max_points=max_points)
     ax[0].set_xlabel('SV1')
     ax[0].set_ylabel('SV2')
 
@@ -42,16 +116,163 @@ def plot_svd(X_new, features, p):
 def project_svd(q, s, k):
     """
     The function returns the design matrix projected on to the
-    first k singular vectors.
+    first k singular vectors. `s` may be the diagonal matrix or the vector
+    of singular values.
     """
+    if np.ndim(s) == 1:
+        return q[:, :k] * s[:k]
     return q[:, :k].dot(s[:k, :k])
 
+import os
+import json
+from collections import Counter
+from scipy.sparse import csr_matrix
+class LSA:
+    """Latent semantic analysis model with query fold-in and search
+
+    Documents are turned into L2-normalized tf-idf vectors, reduced with
+    `truncated_svd` and kept as unit-length rows of ``q S`` so that a query
+    is compared with each document in the `k`-dimensional space only.
+
+    Parameters
+    ----------
+    k : int, optional
+        Number of singular vectors to keep
+    tokenizer : function, optional
+        Accepts a document and returns its words; defaults to lowercasing
+        and splitting on whitespace
+    **svd_params
+        Passed to `truncated_svd`
+    """
+
+    def __init__(self, k=100, tokenizer=None, **svd_params):
+        self.k = k
+        self.tokenizer = tokenizer or (lambda doc: doc.lower().split())
+        self.svd_params = svd_params
+
+    def _tfidf(self, docs, fit_idf=False):
+        """Return the L2-normalized tf-idf matrix of docs as CSR
+
+        With `fit_idf`, the idf is first computed from docs.
+        """
+        indptr, indices, data = [0], [], []
+        for doc in docs:
+            for word, count in Counter(self.tokenizer(doc)).items():
+                j = self.word_index.get(word)
+                if j is not None:
+                    indices.append(j)
+                    data.append(count)
+            indptr.append(len(indices))
+        X = csr_matrix((np.array(data, dtype=float), indices, indptr),
+                       shape=(len(indptr) - 1, len(self.vocabulary)))
+        if fit_idf:
+            count = np.bincount(X.indices, minlength=X.shape[1])
+            self.idf = np.log(X.shape[0] / count)
+        X.data *= self.idf[X.indices]
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        X.data /= np.repeat(norms, np.diff(X.indptr))
+        return X
+
+    def fit(self, docs):
+        """Build the vocabulary, idf and LSA factors of docs
+
+        Parameters
+        ----------
+        docs : sequence of str
+            Corpus to fit
+
+        Returns
+        -------
+        self : LSA
+        """
+
+        self.vocabulary = sorted({word for doc in docs
+                                  for word in self.tokenizer(doc)})
+        self.word_index = {word: i for i, word in enumerate(self.vocabulary)}
+        X = self._tfidf(docs, fit_idf=True)
+        q, self.s, self.p, self.ratio = truncated_svd(X, self.k,
+                                                      **self.svd_params)
+        self.doc_vectors = self._unit(project_svd(q, self.s, self.k))
+        return self
+
+    @staticmethod
+    def _unit(vectors):
+        """Return vectors scaled to unit length row by row"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return (vectors / norms).astype(np.float32)
+
+    def transform(self, new_docs):
+        """Fold new documents into the LSA space
+
+        Parameters
+        ----------
+        new_docs : sequence of str
+            Documents to transform
+
+        Returns
+        -------
+        ndarray
+            Coordinates ``x P S^-1`` of each document, comparable with the
+            rows of q returned by `truncated_svd`
+        """
+
+        return (self._tfidf(new_docs) @ self.p) / self.s
+
+    def search(self, query, k=10):
+        """Return the `k` documents most similar to query
+
+        Parameters
+        ----------
+        query : str
+            Text to search for
+        k : int, optional
+            Number of documents to return
+
+        Returns
+        -------
+        indices : ndarray
+            Indices to the most similar documents, most similar first
+        similarities : ndarray
+            Cosine similarity of each returned document in the LSA space
+        """
+
+        vec = self._unit(self.transform([query]) * self.s)[0]
+        sims = self.doc_vectors @ vec
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind='stable')]
+        return top, sims[top]
+
+    def save(self, path):
+        """Save the model to the directory `path` as `.npy` files"""
+        os.makedirs(path, exist_ok=True)
+        for name in ('idf', 's', 'p', 'ratio', 'doc_vectors'):
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'vocabulary.json'), 'w') as file:
+            json.dump(self.vocabulary, file)
+
+    @classmethod
+    def load(cls, path, tokenizer=None, mmap_mode='r'):
+        """Load a model saved with `save`, memory-mapping its arrays"""
+        model = cls(tokenizer=tokenizer)
+        for name in ('idf', 's', 'p', 'ratio', 'doc_vectors'):
+            setattr(model, name, np.load(os.path.join(path, f'{name}.npy'),
+                                         mmap_mode=mmap_mode))
+        with open(os.path.join(path, 'vocabulary.json')) as file:
+            model.vocabulary = json.load(file)
+        model.word_index = {word: i for i, word in
+                            enumerate(model.vocabulary)}
+        model.k = len(model.s)
+        return model
+
 from sklearn.decomposition import PCA
 
 pca = PCA()
 X_new2 = pca.fit_transform(X)
 fig, ax = plt.subplots(1, 1, subplot_kw=dict(aspect='equal'), dpi=150)
-ax.scatter(X_new2[:,0], X_new2[:,1])
+density_scatter(ax, X_new2[:,0], X_new2[:,1])
 for feature, vec in zip(features, pca.components_.T):
     ax.arrow(0, 0, 100*vec[0], 100*vec[1], width=5, ec='none', fc='r')
     ax.text(130*vec[0], 130*vec[1], feature, ha='center', color='r')
@@ -62,18 +283,75 @@ from nltk.corpus import wordnet
 from nltk.stem import WordNetLemmatizer
 from nltk.corpus import stopwords
 from nltk.tokenize import RegexpTokenizer
-def preprocess(document):
-    """Accepts documents and returns only the necessary words."""
-    wordnet_lemmatizer = WordNetLemmatizer()
-    tokenizer = RegexpTokenizer(r'[a-z]+')
-    stop_words = set(stopwords.words('english'))
+from functools import lru_cache
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+class Preprocessor:
+    def __init__(self, cache_size=100000):
+        """Load the lemmatizer, tokenizer and stopwords once
+
+        Lemmas are memoized per word in an LRU cache of `cache_size` words.
+        """
+        self.cache_size = cache_size
+        self.lemmatizer = WordNetLemmatizer()
+        self.tokenizer = RegexpTokenizer(r'[a-z]+')
+        self.stop_words = set(stopwords.words('english'))
+        self.lemma = lru_cache(maxsize=cache_size)(self._lemma)
+
+    def _lemma(self, word):
+        """Lemmatize word as a noun, verb, adjective then adverb"""
+        for pos in [wordnet.NOUN, wordnet.VERB, wordnet.ADJ, wordnet.ADV]:
+            word = self.lemmatizer.lemmatize(word, pos)
+        return word
+
+    def __call__(self, document):
+        """Accepts documents and returns only the necessary words."""
+        words = self.tokenizer.tokenize(document.lower())
+        return " ".join(self.lemma(w) for w in words
+                        if w not in self.stop_words)
 
-    document = document.lower()  # Convert to lowercase
-    words = tokenizer.tokenize(document)  # Tokenize
-    words = [w for w in words if not w in stop_words]  # Removing stopwords
+    def preprocess_many(self, docs, n_jobs=1, chunksize=1000):
+        """Preprocess docs lazily, in order, on `n_jobs` processes
 
-    # Lemmatizing
-    for pos in [wordnet.NOUN, wordnet.VERB, wordnet.ADJ, wordnet.ADV]:
-        words = [wordnet_lemmatizer.lemmatize(x, pos) for x in words]
+        Documents are sent to the workers `chunksize` at a time and at most
+        two windows of ``4 * n_jobs * chunksize`` documents are in flight,
+        so `docs` may be a generator over a corpus that does not fit in
+        memory.
+        """
+        if n_jobs == 1:
+            for doc in docs:
+                yield self(doc)
+            return
+        docs = iter(docs)
+        window = 4 * n_jobs * chunksize
+        with ProcessPoolExecutor(n_jobs, initializer=_init_preprocessor,
+                                 initargs=(self.cache_size,)) as pool:
+            pending = pool.map(_preprocess_worker, islice(docs, window),
+                               chunksize=chunksize)
+            while True:
+                batch = list(islice(docs, window))
+                upcoming = (pool.map(_preprocess_worker, batch,
+                                     chunksize=chunksize)
+                            if batch else None)
+                yield from pending
+                if upcoming is None:
+                    break
+                pending = upcoming
 
-    return " ".join(words)
\ No newline at end of file
+_preprocessor = None
+
+def _init_preprocessor(cache_size):
+    """Create the Preprocessor of a worker process"""
+    global _preprocessor
+    _preprocessor = Preprocessor(cache_size)
+
+def _preprocess_worker(document):
+    """Preprocess document with the Preprocessor of this process"""
+    return _preprocessor(document)
+
+def preprocess(document):
+    """Accepts documents and returns only the necessary words."""
+    global _preprocessor
+    if _preprocessor is None:
+        _preprocessor = Preprocessor()
+    return _preprocessor(document)